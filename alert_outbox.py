@@ -0,0 +1,241 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+OUTBOX_PATH = os.path.join("processed", "alert_outbox.db")
+MAX_ATTEMPTS = 8      # 최대 발송 시도 횟수
+BACKOFF_BASE = 2      # 재시도 대기 시간(초) = BACKOFF_BASE * 2^(시도 횟수-1)
+BACKOFF_MAX = 300     # 최대 재시도 대기 시간(초)
+LEASE_SECONDS = 60    # 발송 중인 알림을 다른 디스패처가 가져가지 못하게 잡아두는 시간
+POLL_INTERVAL = 5     # 새 알림이 없을 때 outbox 를 확인하는 주기(초)
+
+# 보호자 연락처
+ALERT_TO = "+821052928302"
+ALERT_FROM = "+12298087476"
+
+
+class TwilioAlertClient:
+    """
+    Twilio 로 전화/문자를 보내는 알림 클라이언트.
+    """
+
+    def __init__(self, account_sid=None, auth_token=None):
+        from twilio.rest import Client
+        account_sid = account_sid or os.getenv("ACCOUNT_SID")
+        auth_token = auth_token or os.getenv("AUTH_TOKEN")
+        if not account_sid or not auth_token:
+            raise ValueError("Twilio 계정 정보(ACCOUNT_SID, AUTH_TOKEN)가 설정되지 않았습니다.")
+        self.client = Client(account_sid, auth_token)
+
+    def send(self, kind, payload):
+        if kind == "call":
+            self.client.calls.create(twiml=payload["twiml"], to=payload["to"], from_=payload["from"])
+        elif kind == "sms":
+            self.client.messages.create(body=payload["body"], to=payload["to"], from_=payload["from"])
+        else:
+            raise ValueError(f"Unknown alert kind: {kind}")
+
+
+class FakeAlertClient:
+    """
+    실제로 발송하지 않고 기록만 하는 알림 클라이언트 (개발/테스트용).
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, kind, payload):
+        print(f"[FAKE ALERT] {kind}: {payload}")
+        self.sent.append((kind, payload))
+
+
+def create_client():
+    """
+    알림 클라이언트를 생성합니다. 기본값은 Twilio 이며, ALERT_CLIENT=fake 로 명시한 경우에만 Fake 를 사용합니다.
+    Twilio 계정 정보가 없으면 예외가 발생하고, 디스패처는 이를 발송 실패로 기록합니다.
+    """
+    name = os.getenv("ALERT_CLIENT", "twilio")
+    if name == "fake":
+        return FakeAlertClient()
+    if name == "twilio":
+        return TwilioAlertClient()
+    raise ValueError(f"Unknown alert client: {name}")
+
+
+class AlertOutbox:
+    """
+    발송할 알림을 로컬 SQLite 파일에 저장하는 outbox.
+    dedup_key 가 같은 알림은 한 번만 저장되므로 같은 알림이 중복 발송되지 않습니다.
+    """
+
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        self.pending = threading.Event()  # 새 알림이 들어왔음을 디스패처에 알림
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                create table if not exists alert_outbox (
+                    id integer primary key autoincrement,
+                    dedup_key text not null unique,
+                    kind text not null,
+                    payload text not null,
+                    status text not null default 'pending',
+                    attempts integer not null default 0,
+                    next_attempt_at real not null,
+                    last_error text,
+                    created_at real not null
+                )""")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:  # 블록이 끝나면 커밋, 예외가 발생하면 롤백
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, dedup_key, kind, payload):
+        """
+        알림을 저장합니다. 이미 같은 dedup_key 가 있으면 무시하고 False 를 반환합니다.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "insert or ignore into alert_outbox (dedup_key, kind, payload, next_attempt_at, created_at) "
+                "values (?, ?, ?, ?, ?)",
+                (dedup_key, kind, json.dumps(payload, ensure_ascii=False), now, now))
+            inserted = cursor.rowcount > 0
+        if inserted:
+            self.pending.set()
+        return inserted
+
+    def claim(self, limit=10):
+        """
+        발송 시각이 된 알림을 가져오고 LEASE_SECONDS 동안 다른 디스패처가 가져가지 못하게 합니다.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("begin immediate")
+            rows = conn.execute(
+                "select id, kind, payload, attempts from alert_outbox "
+                "where status = 'pending' and next_attempt_at <= ? order by id limit ?",
+                (now, limit)).fetchall()
+            conn.executemany("update alert_outbox set next_attempt_at = ? where id = ?",
+                             [(now + LEASE_SECONDS, row[0]) for row in rows])
+        return [(row_id, kind, json.loads(payload), attempts) for row_id, kind, payload, attempts in rows]
+
+    def mark_sent(self, row_id):
+        with self._connect() as conn:
+            conn.execute("update alert_outbox set status = 'sent', attempts = attempts + 1, last_error = null "
+                         "where id = ?", (row_id,))
+
+    def mark_failed(self, row_id, attempts, error):
+        """
+        발송 실패를 기록하고 지수 백오프로 다음 시도 시각을 정합니다.
+        MAX_ATTEMPTS 를 넘으면 더 이상 시도하지 않습니다.
+        """
+        attempts += 1
+        status = "failed" if attempts >= MAX_ATTEMPTS else "pending"
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+        with self._connect() as conn:
+            conn.execute("update alert_outbox set status = ?, attempts = ?, next_attempt_at = ?, last_error = ? "
+                         "where id = ?", (status, attempts, time.time() + delay, str(error), row_id))
+        return status
+
+
+class AlertDispatcher:
+    """
+    outbox 의 알림을 백그라운드에서 발송하는 디스패처. 실패하면 재시도합니다.
+    """
+
+    def __init__(self, outbox, client_factory=create_client):
+        self.outbox = outbox
+        self.client_factory = client_factory
+        self.client = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def dispatch_once(self):
+        """
+        발송 시각이 된 알림을 한 번 처리하고 처리한 수를 반환합니다.
+        """
+        rows = self.outbox.claim()
+        if rows and self.client is None:
+            try:
+                self.client = self.client_factory()
+            except Exception as e:
+                # 클라이언트를 만들 수 없으면(계정 정보 누락 등) 발송 실패로 기록하여 재시도/실패 상태에 남김
+                for row_id, kind, payload, attempts in rows:
+                    status = self.outbox.mark_failed(row_id, attempts, e)
+                    print(f"알림 발송 실패 : {kind} ({row_id}) {status} - {e}")
+                return len(rows)
+        for row_id, kind, payload, attempts in rows:
+            try:
+                self.client.send(kind, payload)
+                self.outbox.mark_sent(row_id)
+                print(f"알림 발송 완료 : {kind} ({row_id})")
+            except Exception as e:
+                status = self.outbox.mark_failed(row_id, attempts, e)
+                print(f"알림 발송 실패 : {kind} ({row_id}) {status} - {e}")
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.dispatch_once():
+                    continue
+            except Exception as e:
+                print(f"알림 디스패처 오류 : {e}")
+            self.outbox.pending.wait(POLL_INTERVAL)
+            self.outbox.pending.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.outbox.pending.set()
+        if self._thread:
+            self._thread.join()
+
+
+def emergency_alerts(emg_log_id):
+    """
+    위급 상황 알림(전화 + 문자) 목록을 (dedup_key, kind, payload) 로 반환합니다.
+    """
+    return [
+        (f"{emg_log_id}:call", "call", {
+            "to": ALERT_TO,
+            "from": ALERT_FROM,
+            "twiml": "<Response><Say>The current guardian is in danger</Say></Response>",
+        }),
+        (f"{emg_log_id}:sms", "sms", {
+            "to": ALERT_TO,
+            "from": ALERT_FROM,
+            "body": "위급 상황입니다.",
+        }),
+    ]
+
+
+def enqueue_emergency_alert(outbox, emg_log_id):
+    """
+    위급 상황 알림(전화 + 문자)을 outbox 에 저장합니다. 같은 EMG_LOG_ID 의 알림은 한 번만 저장됩니다.
+    """
+    for dedup_key, kind, payload in emergency_alerts(emg_log_id):
+        outbox.enqueue(dedup_key, kind, payload)
+
+
+def send_emergency_alert(client, emg_log_id):
+    """
+    outbox 를 거치지 않고 위급 상황 알림을 바로 발송합니다. (outbox 에 저장할 수 없을 때 사용)
+    """
+    for _, kind, payload in emergency_alerts(emg_log_id):
+        client.send(kind, payload)
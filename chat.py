@@ -1,10 +1,11 @@
-from io import BytesIO
-
+import json
 import openai
 import os
+import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from flask import Blueprint, request, jsonify, app
+from flask import Blueprint, request, jsonify, app, Response, stream_with_context
 from common_utils import token_required, log, g
 import requests
 import logging
@@ -24,6 +25,11 @@ client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY")  # 환경 변수에서 API 키 로드
 )
 SPRING_BOOT_API_URL = os.getenv("SPRING_BOOT_API_URL")
+AI_SENDER_UUID = "ai-uuid-1234-5678-90ab-cdef12345678"
+
+# /chat 요청에서 서로 독립적인 작업(메시지 저장, TTS 생성)을 동시에 실행하는 스레드 풀
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "16"))
+chat_executor = ThreadPoolExecutor(max_workers=CHAT_WORKERS, thread_name_prefix="chat")
 
 
 # 로깅 초기화
@@ -164,164 +170,309 @@ def update_chat_session(workspace_id, headers):
         log.error(f"채팅 세션 업데이트 에러: {e}")
 
 
+def save_chat_message(chat_data, headers):
+    """
+    채팅 메시지를 저장하고 세션 메시지 수를 업데이트합니다.
+    저장에 실패하면 응답에 그대로 사용할 수 있는 오류 메시지로 예외를 발생시킵니다.
+    """
+    label = "사용자" if chat_data["msgSenderRole"] == "USER" else "AI"
+    try:
+        response = requests.post(f"{SPRING_BOOT_API_URL}/api/chat/save", json=chat_data, headers=headers)
+    except Exception as e:
+        log.error(f"{label} 메시지 저장 중 오류: {e}")
+        raise Exception(f"{label} 메시지 저장 중 오류: {e}")
+    if response.status_code != 201:
+        log.error(f"{label} 메시지 저장 실패: {response.text}")
+        raise Exception(f"{label} 메시지 저장 실패")
+    # ** 세션 메시지 수 업데이트 **
+    update_chat_session(chat_data["msgWorkspaceId"], headers)
+
+
+def build_reply_messages(user_message):
+    """
+    사용자 메시지의 감정을 분석하고, 그 감정을 고려하도록 GPT 에 보낼 메시지 목록을 만듭니다.
+    """
+    emotion = analyze_sentiment(user_message)  # 입력된 메시지에 대해 감정 분석 수행
+    return [
+        {"role": "system",
+         "content": "당신은 친절하고 공감 능력이 뛰어난 AI 비서입니다. 대화 상대가 어르신이기 때문에 항상 공손하고 따뜻한 한국어로만 대답하세요."
+                    f"사용자의 감정은 '{emotion}'입니다. 이 감정을 고려하여 답변을 작성하세요."},
+        {"role": "user", "content": user_message}
+    ]
+
+
+def generate_reply(user_message):
+    """
+    사용자 메시지의 감정을 분석하고, 그 감정을 고려한 AI 응답을 생성합니다.
+    """
+    response = client.chat.completions.create(
+        model="gpt-4-turbo",
+        messages=build_reply_messages(user_message)
+    )
+    # 응답 메시지 추출
+    ai_reply = response.choices[0].message.content.strip()
+    if not ai_reply:
+        raise ValueError("AI 응답이 비어 있습니다. 다시 시도해주세요.")
+    return ai_reply
+
+
+def stream_reply(user_message):
+    """
+    generate_reply 의 스트리밍 버전. GPT 응답 토큰을 도착하는 대로 반환합니다.
+    """
+    response = client.chat.completions.create(
+        model="gpt-4-turbo",
+        messages=build_reply_messages(user_message),
+        stream=True
+    )
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# 문장 끝(마침표, 물음표, 느낌표, 말줄임표, 줄바꿈) 뒤에서 문장을 나눔
+SENTENCE_END = re.compile(r"(?<=[.!?…。])\s+|\n+")
+
+
+def split_sentences(buffer):
+    """
+    버퍼에서 완성된 문장 목록과 아직 끝나지 않은 나머지 문자열을 반환합니다.
+    """
+    parts = SENTENCE_END.split(buffer)
+    sentences = [part.strip() for part in parts[:-1] if part.strip()]
+    return sentences, parts[-1]
+
+
+def sse_event(event, data):
+    """
+    server-sent events 형식의 이벤트 문자열을 만듭니다.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def preflight_response():
+    response = jsonify({"status": "OK"})
+    response.headers.add("Access-Control-Allow-Origin", "http://localhost:3000")
+    response.headers.add("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+    response.headers.add("Access-Control-Allow-Headers", "Authorization, RefreshToken, Content-Type")
+    response.headers.add("Access-Control-Allow-Credentials", "true")
+    return response, 200
+
+
+def prepare_chat_request(current_user):
+    """
+    요청에서 토큰과 메시지를 확인하고 워크스페이스를 조회(또는 생성)합니다.
+    (채팅 정보, None) 또는 오류 시 (None, 오류 응답)을 반환합니다.
+    """
+    # 갱신된 Access Token, RefreshToken 가져오기
+    token = g.get("access_token", None)
+    refresh_token = g.get("refresh_token", None)
+
+    # RefreshToken 헤더 가져오기
+    # refresh_token_header = request.headers.get('RefreshToken', '')
+    # refresh_token = refresh_token_header.split(' ')[1] if 'Bearer ' in refresh_token_header else None
+
+    if not token or not refresh_token:
+        return None, (jsonify({"error": "Missing accessToken or refreshToken."}), 401)
+
+    user_message = request.json.get("message")
+    create_workspace_flag = request.json.get("createWorkspace", False)  # 플래그 확인
+    existing_workspace_id = request.json.get("workspaceId")  # 선택한 워크스페이스ID
+    log.info(f"리액트에서 받은 워크스페이스ID: {existing_workspace_id}")
+    workspace_id = None  # 초기화
+
+    if not user_message:
+        return None, (jsonify({"error": "No message provided."}), 400)
+
+    # 워크스페이스 조회 또는 생성
+    try:
+        if create_workspace_flag:
+            ai_reply = "처음 메시지입니다. AI 응답이 준비되었습니다."
+            # 워크스페이스 생성
+            workspace_id = create_workspace(current_user, user_message, ai_reply)
+        else:
+            # 기존 워크스페이스 조회
+            workspace_id = existing_workspace_id
+            if not workspace_id:
+                return None, (jsonify({"error": "워크스페이스가 없습니다."}), 404)
+    except Exception as e:
+        log.error(f"Workspace error: {e}")
+        return None, (jsonify({"error": "Workspace creation or retrieval failed"}), 500)
+
+    # 이후 코드에서 workspaceId를 사용
+    user_chat_data = {
+        "msgId": str(uuid.uuid4()),
+        "msgSenderRole": "USER",
+        "msgContent": user_message,
+        "msgSentAt": int(datetime.now(timezone.utc).timestamp() * 1000),
+        "msgSenderUUID": current_user,
+        "parentMsgId": None,
+        "msgType": "T",
+        "msgWorkspaceId": workspace_id
+    }
+
+    headers = {
+        'Authorization': f'Bearer {token}',  # g.access_token 사용
+        'RefreshToken': f'Bearer {refresh_token}'  # RefreshToken 추가
+    }
+    return {"message": user_message, "workspaceId": workspace_id,
+            "userChatData": user_chat_data, "headers": headers}, None
+
+
+def build_assistant_chat_data(user_chat_data, ai_reply):
+    return {
+        "msgId": str(uuid.uuid4()),
+        "msgSenderRole": "AI",
+        "msgContent": ai_reply,
+        "msgSentAt": user_chat_data["msgSentAt"],
+        "msgSenderUUID": AI_SENDER_UUID,
+        "parentMsgId": user_chat_data["msgId"],
+        "msgType": "T",
+        "msgWorkspaceId": user_chat_data["msgWorkspaceId"]
+    }
+
+
 def register_routes(app):
     # Chat 엔드포인트
     @app.route("/chat", methods=["POST", "OPTIONS"])
     @token_required
     def chat(current_user=None):
         if request.method == "OPTIONS":
-            response = jsonify({"status": "OK"})
-            response.headers.add("Access-Control-Allow-Origin", "http://localhost:3000")
-            response.headers.add("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-            response.headers.add("Access-Control-Allow-Headers", "Authorization, RefreshToken, Content-Type")
-            response.headers.add("Access-Control-Allow-Credentials", "true")
-            return response, 200
+            return preflight_response()
         elif request.method == "POST":
-            data = request.json
-            # 갱신된 Access Token, RefreshToken 가져오기
-            token = g.get("access_token", None)
-            refresh_token = g.get("refresh_token", None)
+            chat_request, error = prepare_chat_request(current_user)
+            if error:
+                return error
+            user_message = chat_request["message"]
+            workspace_id = chat_request["workspaceId"]
+            user_chat_data = chat_request["userChatData"]
+            headers = chat_request["headers"]
 
-            # RefreshToken 헤더 가져오기
-            # refresh_token_header = request.headers.get('RefreshToken', '')
-            # refresh_token = refresh_token_header.split(' ')[1] if 'Bearer ' in refresh_token_header else None
+            # 사용자 메시지 저장(+ 세션 업데이트)은 감정 분석 및 AI 응답 생성과 동시에 실행
+            user_save = chat_executor.submit(save_chat_message, user_chat_data, headers)
 
-            if not token or not refresh_token:
-                return jsonify({"error": "Missing accessToken or refreshToken."}), 401
-
-            user_message = request.json.get("message")
-            create_workspace_flag = request.json.get("createWorkspace", False)  # 플래그 확인
-            existing_workspace_id = request.json.get("workspaceId")  # 선택한 워크스페이스ID
-            log.info(f"리액트에서 받은 워크스페이스ID: {existing_workspace_id}")
-            workspace_id = None  # 초기화
+            # AI 응답 생성
+            try:
+                # 감정 분석 및 AI 응답 생성
+                ai_reply = generate_reply(user_message)
+            except Exception as e:
+                log.error(f"AI 응답 또는 TTS 생성 실패: {e}")
+                return jsonify({"error": "AI 응답 생성 중 오류"}), 500
 
-            if not user_message:
-                return jsonify({"error": "No message provided."}), 400
+            # TTS 생성은 AI 메시지 저장과 동시에 실행
+            tts_task = chat_executor.submit(generate_tts, ai_reply)
 
-            # 워크스페이스 조회 또는 생성
+            # AI 메시지는 사용자 메시지(parentMsgId)가 저장된 뒤에 저장
             try:
-                if create_workspace_flag:
-                    ai_reply = "처음 메시지입니다. AI 응답이 준비되었습니다."
-                    # 워크스페이스 생성
-                    workspace_id = create_workspace(current_user, user_message, ai_reply)
-                else:
-                    # 기존 워크스페이스 조회
-                    workspace_id = existing_workspace_id
-                    if not workspace_id:
-                        return jsonify({"error": "워크스페이스가 없습니다."}), 404
+                user_save.result()
             except Exception as e:
-                log.error(f"Workspace error: {e}")
-                return jsonify({"error": "Workspace creation or retrieval failed"}), 500
-
-
-            # 이후 코드에서 workspaceId를 사용
-            # 사용자 메시지 저장 및 AI 응답 로직은 그대로 유지
-            user_msg_id = str(uuid.uuid4())
-            sent_at_epoch = int(datetime.now(timezone.utc).timestamp() * 1000)
-            user_chat_data = {
-                "msgId": user_msg_id,
-                "msgSenderRole": "USER",
-                "msgContent": user_message,
-                "msgSentAt": sent_at_epoch,
-                "msgSenderUUID": current_user,
-                "parentMsgId": None,
-                "msgType": "T",
-                "msgWorkspaceId": workspace_id
-            }
-
-            headers = {
-                'Authorization': f'Bearer {token}',  # g.access_token 사용
-                'RefreshToken': f'Bearer {refresh_token}'  # RefreshToken 추가
-            }
+                tts_task.cancel()
+                return jsonify({"error": str(e)}), 500
 
+            # AI 메시지 저장
             try:
-                response_user = requests.post(f"{SPRING_BOOT_API_URL}/api/chat/save", json=user_chat_data,
-                                              headers=headers)
-
-                if response_user.status_code == 201:
-                    # ** 세션 메시지 수 업데이트 **
-                    update_chat_session(user_chat_data["msgWorkspaceId"], headers)
-                else:
-                    log.error(f"사용자 메시지 저장 실패: {response_user.text}")
-                    return jsonify({"error": "사용자 메시지 저장 실패"}), 500
+                save_chat_message(build_assistant_chat_data(user_chat_data, ai_reply), headers)
             except Exception as e:
-                log.error(f"사용자 메시지 저장 중 오류: {e}")
-                return jsonify({"error": f"사용자 메시지 저장 중 오류: {e}"}), 500
+                return jsonify({"error": str(e)}), 500
 
-            # AI 응답 생성
             try:
-                # 감정 분석 및 AI 응답 생성
-                emotion = analyze_sentiment(user_message)  # 입력된 메시지에 대해 감정 분석 수행
-
-                response = client.chat.completions.create(
-                    model="gpt-4-turbo",
-                    messages=[
-                        {"role": "system",
-                         "content": "당신은 친절하고 공감 능력이 뛰어난 AI 비서입니다. 대화 상대가 어르신이기 때문에 항상 공손하고 따뜻한 한국어로만 대답하세요."
-                                    f"사용자의 감정은 '{emotion}'입니다. 이 감정을 고려하여 답변을 작성하세요."},
-                        {"role": "user", "content": user_message}
-                    ]
-                )
-                # 응답 메시지 추출
-                ai_reply = response.choices[0].message.content.strip()
-                if not ai_reply:
-                    raise ValueError("AI 응답이 비어 있습니다. 다시 시도해주세요.")
-
-                # TTS 생성
-                audio_base64 = generate_tts(ai_reply)
+                audio_base64 = tts_task.result()
             except Exception as e:
                 log.error(f"AI 응답 또는 TTS 생성 실패: {e}")
                 return jsonify({"error": "AI 응답 생성 중 오류"}), 500
 
+            return jsonify({"reply": ai_reply, "audioBase64": audio_base64, "workspaceId": workspace_id}), 200
 
+    # Chat 스트리밍 엔드포인트 (server-sent events)
+    # token : GPT 응답 토큰, audio : 문장 단위 TTS(순서대로), done : 저장 완료, error : 오류
+    @app.route("/chat/stream", methods=["POST", "OPTIONS"])
+    @token_required
+    def chat_stream(current_user=None):
+        if request.method == "OPTIONS":
+            return preflight_response()
+
+        chat_request, error = prepare_chat_request(current_user)
+        if error:
+            return error
+        user_message = chat_request["message"]
+        workspace_id = chat_request["workspaceId"]
+        user_chat_data = chat_request["userChatData"]
+        headers = chat_request["headers"]
+
+        def generate():
+            # 사용자 메시지 저장(+ 세션 업데이트)은 응답 스트리밍과 동시에 실행
+            user_save = chat_executor.submit(save_chat_message, user_chat_data, headers)
+            yield sse_event("start", {"workspaceId": workspace_id, "msgId": user_chat_data["msgId"]})
+
+            tts_tasks = []  # 문장 순서대로 (문장, TTS Future)
+            sent_audio = 0
+
+            def submit_tts(sentence):
+                tts_tasks.append((sentence, chat_executor.submit(generate_tts, sentence)))
+
+            def ready_audio(wait=False):
+                # 앞 문장의 음성이 준비된 만큼만 순서대로 내보냄
+                nonlocal sent_audio
+                while sent_audio < len(tts_tasks):
+                    sentence, task = tts_tasks[sent_audio]
+                    if not wait and not task.done():
+                        return
+                    yield sse_event("audio", {"index": sent_audio, "text": sentence, "audioBase64": task.result()})
+                    sent_audio += 1
+
+            reply_parts = []
+            buffer = ""
+            try:
+                for token in stream_reply(user_message):
+                    reply_parts.append(token)
+                    yield sse_event("token", {"text": token})
+                    sentences, buffer = split_sentences(buffer + token)
+                    for sentence in sentences:
+                        submit_tts(sentence)
+                    yield from ready_audio()
+
+                ai_reply = "".join(reply_parts).strip()
+                if not ai_reply:
+                    raise ValueError("AI 응답이 비어 있습니다. 다시 시도해주세요.")
+                if buffer.strip():
+                    submit_tts(buffer.strip())
+                yield from ready_audio(wait=True)
+            except Exception as e:
+                log.error(f"AI 응답 또는 TTS 생성 실패: {e}")
+                for _, task in tts_tasks:
+                    task.cancel()
+                yield sse_event("error", {"error": "AI 응답 생성 중 오류"})
+                return
 
-            # AI 메시지 저장
-            assistant_msg_id = str(uuid.uuid4())
-            assistant_chat_data = {
-                "msgId": assistant_msg_id,
-                "msgSenderRole": "AI",
-                "msgContent": ai_reply,
-                "msgSentAt": sent_at_epoch,
-                "msgSenderUUID": "ai-uuid-1234-5678-90ab-cdef12345678",
-                "parentMsgId": user_msg_id,
-                "msgType": "T",
-                "msgWorkspaceId": workspace_id
-            }
-
+            # 응답이 끝난 뒤 사용자 메시지 저장을 기다렸다가 AI 메시지 저장
             try:
-                response_assistant = requests.post(f"{SPRING_BOOT_API_URL}/api/chat/save", json=assistant_chat_data,
-                                                   headers=headers)
-                if response_assistant.status_code == 201:
-                    # **세션 메시지 수 업데이트**
-                    update_chat_session(assistant_chat_data["msgWorkspaceId"], headers)
-                else:
-                    log.error(f"AI 메시지 저장 실패: {response_assistant.text}")
-                    return jsonify({"error": "AI 메시지 저장 실패"}), 500
+                user_save.result()
+                save_chat_message(build_assistant_chat_data(user_chat_data, ai_reply), headers)
             except Exception as e:
-                log.error(f"AI 메시지 저장 중 오류: {e}")
-                return jsonify({"error": f"AI 메시지 저장 중 오류: {e}"}), 500
+                yield sse_event("error", {"error": str(e)})
+                return
+            yield sse_event("done", {"reply": ai_reply, "workspaceId": workspace_id})
 
-            return jsonify({"reply": ai_reply, "audioBase64": audio_base64, "workspaceId": workspace_id}), 200
+        return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 
 
-from gtts import gTTS
 import base64
+import tts_cache
 
 def generate_tts(ai_reply):
     """
     AI 응답 텍스트를 기반으로 TTS 음성을 생성하여 Base64 인코딩된 문자열로 반환합니다.
+    자주 반복되는 문장은 TTS 캐시에서 바로 가져옵니다.
     """
     try:
-        tts = gTTS(ai_reply, lang="ko")
-        audio_data = BytesIO()
-        tts.write_to_fp(audio_data)
-        audio_data.seek(0)  # 스트림의 시작으로 이동
+        audio = tts_cache.get_audio(ai_reply, lang="ko")
 
         # Base64 인코딩
-        audio_base64 = base64.b64encode(audio_data.read()).decode("utf-8")
+        audio_base64 = base64.b64encode(audio).decode("utf-8")
         return audio_base64
     except Exception as e:
         log.error(f"TTS 생성 실패: {e}")
-        raise Exception("TTS 생성 중 오류가 발생했습니다.")
\ No newline at end of file
+        raise Exception("TTS 생성 중 오류가 발생했습니다.")
@@ -3,20 +3,153 @@
 # 데이터베이스 연결 관리용 공통 모듈 정의 (전역변수와 함수, 클래스만 정의)
 
 # 사용할 패키지 임포트함
-import cx_Oracle
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import cx_Oracle
+except ImportError:  # 대체 드라이버(set_driver)로만 사용하는 환경
+    cx_Oracle = None
 
 # db 연결을 위한 값들을 전역변수로 지정
 url = "ktj0514.synology.me/xe"
 user = "C##KIMTEST"
 passwd = "1234"
 
-def oracle_init():  # 애플리케이션(프로젝트)에서 딱 한번만 구동시킴
+# 세션 풀 설정
+POOL_MIN = 1        # 최소 연결 수
+POOL_MAX = 8        # 최대 연결 수
+POOL_INCREMENT = 1  # 부족할 때 한 번에 늘리는 연결 수
+PING_INTERVAL = 60  # 이 시간(초) 이상 쉬었던 연결은 사용 전에 상태 확인
+PING_SQL = "select 1 from dual"
+STMT_CACHE_SIZE = 40  # 연결별 문장 캐시 크기 (바인드 변수 쿼리의 재파싱 방지)
+
+driver = cx_Oracle  # DB-API 드라이버 (테스트에서는 set_driver 로 교체)
+_factory = None     # 대체 드라이버의 연결 생성 함수 (None 이면 driver.connect(user, passwd, url))
+_ping_sql = PING_SQL
+_pool = None
+_pool_lock = threading.Lock()
+_oracle_initialized = False
+
+def oracle_init():  # 애플리케이션(프로젝트)에서 딱 한번만 구동시킴 (처음 풀을 만들 때 호출됨)
+    global _oracle_initialized
+    if _oracle_initialized:
+        return
     cx_Oracle.init_oracle_client(lib_dir="D:\\instantclient_18_5")
     # Mac 에서는 필요없음
+    _oracle_initialized = True
+
+class SimplePool:
+    """
+    SessionPool 이 없는 DB-API 드라이버용 연결 풀 (로컬 대체 드라이버 테스트용).
+    cx_Oracle.SessionPool 과 같은 acquire/release 인터페이스를 제공합니다.
+    """
+
+    def __init__(self, factory, min, max, ping_interval=PING_INTERVAL, ping_sql=PING_SQL):
+        self.factory = factory
+        self.max = max
+        self.ping_interval = ping_interval
+        self.ping_sql = ping_sql
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max)
+        for _ in range(min):
+            self._idle.put((factory(), time.monotonic()))
+
+    def _healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(self.ping_sql)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception as e:
+            print("오라클 연결 상태 확인 실패 : ", e)
+            return False
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self.factory()
+                if time.monotonic() - last_used < self.ping_interval or self._healthy(conn):
+                    return conn
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        try:
+            self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+def init_pool(min=POOL_MIN, max=POOL_MAX, increment=POOL_INCREMENT):
+    """
+    프로세스 전체에서 공유하는 세션 풀을 생성합니다.
+    python-oracledb(create_pool), cx_Oracle(SessionPool), 그 외 DB-API 드라이버(SimplePool) 순으로 사용합니다.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+        if driver is cx_Oracle:
+            oracle_init()
+        if hasattr(driver, "create_pool"):
+            _pool = driver.create_pool(user=user, password=passwd, dsn=url,
+                                       min=min, max=max, increment=increment,
+                                       ping_interval=PING_INTERVAL, stmtcachesize=STMT_CACHE_SIZE)
+        elif hasattr(driver, "SessionPool"):
+            _pool = driver.SessionPool(user=user, password=passwd, dsn=url,
+                                       min=min, max=max, increment=increment,
+                                       threaded=True, getmode=driver.SPOOL_ATTRVAL_WAIT)
+            _pool.ping_interval = PING_INTERVAL
+            _pool.stmtcachesize = STMT_CACHE_SIZE
+        else:
+            _pool = SimplePool(_factory or (lambda: driver.connect(user, passwd, url)), min, max,
+                               ping_interval=PING_INTERVAL, ping_sql=_ping_sql)
+        return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def set_driver(module, factory=None, ping_sql=None):
+    """
+    DB-API 드라이버를 교체합니다. (로컬 대체 드라이버로 테스트할 때 사용)
+    factory 는 인자 없이 새 연결을 반환하는 함수이고, ping_sql 은 그 DB 에서 실행되는 상태 확인 쿼리입니다.
+    예) set_driver(sqlite3, lambda: sqlite3.connect(path, check_same_thread=False), "select 1")
+    """
+    global driver, _factory, _ping_sql
+    close_pool()
+    driver = module
+    _factory = factory
+    _ping_sql = ping_sql or PING_SQL
 
 def connect():
     try:
-        conn = cx_Oracle.connect(user, passwd, url)
+        conn = init_pool().acquire()
         # Mac 에서는 아래 구문을 사용해야 함
         # conn = cx_Oracle.connect("c##testweb/testweb@localhost:1521/xe")
         return conn
@@ -26,10 +159,27 @@ def connect():
 def close(conn):
     try:
         if conn:       # conn != null 과 같음 (True 이면)
-            conn.close()
+            init_pool().release(conn)  # 연결을 닫지 않고 풀에 반납
     except Exception as e:
         print("오라클 연결 에러 : ", e)
 
+@contextmanager
+def acquire():
+    """
+    풀에서 연결을 빌려 with 블록 동안 사용하고, 끝나면 풀에 반납합니다.
+    블록에서 예외가 발생하면 롤백합니다.
+    """
+    conn = connect()
+    if conn is None:
+        raise ConnectionError("오라클 연결을 가져오지 못했습니다.")
+    try:
+        yield conn
+    except Exception:
+        rollback(conn)
+        raise
+    finally:
+        close(conn)
+
 def commit(conn):
     try:
         if conn:       # conn != null 과 같음 (True 이면)
@@ -42,4 +192,54 @@ def rollback(conn):
         if conn:       # conn != null 과 같음 (True 이면)
             conn.rollback()
     except Exception as e:
-        print("오라클 트랜잭션 롤백 에러 : ", e)
\ No newline at end of file
+        print("오라클 트랜잭션 롤백 에러 : ", e)
+
+def _self_check():
+    """
+    sqlite3 를 대체 드라이버로 사용하여 connect/commit/close/acquire 와 풀 동작을 확인합니다.
+    """
+    import os
+    import sqlite3
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "check.db")
+        set_driver(sqlite3, lambda: sqlite3.connect(path, check_same_thread=False), "select 1")
+        try:
+            conn = connect()
+            assert conn is not None, "연결을 가져오지 못했습니다."
+            conn.execute("create table emg_log (id integer primary key, status text)")
+            conn.execute("insert into emg_log (status) values ('Y')")
+            commit(conn)
+            close(conn)
+
+            # 예외가 발생하면 롤백되고 연결은 풀에 반납됨
+            try:
+                with acquire() as conn:
+                    conn.execute("insert into emg_log (status) values ('N')")
+                    raise RuntimeError("rollback check")
+            except RuntimeError:
+                pass
+            with acquire() as conn:
+                count = conn.execute("select count(*) from emg_log").fetchone()[0]
+            assert count == 1, f"롤백되지 않았습니다. (행 수 {count})"
+
+            # 다른 스레드에서 빌린 연결과, 오래 쉰 연결의 상태 확인(ping) 경로
+            init_pool().ping_interval = 0
+            result = []
+            worker = threading.Thread(target=lambda: result.append(_use_in_thread()))
+            worker.start()
+            worker.join()
+            assert result == [1], f"다른 스레드에서 연결을 사용하지 못했습니다. ({result})"
+        finally:
+            close_pool()
+            set_driver(cx_Oracle)
+    print("dbConnectTemplate 확인 완료")
+
+def _use_in_thread():
+    with acquire() as conn:
+        return conn.execute("select count(*) from emg_log").fetchone()[0]
+
+if __name__ == "__main__":
+    # python dbConnectTemplate.py : sqlite3 로 풀 동작 확인
+    _self_check()
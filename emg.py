@@ -1,39 +1,55 @@
 import base64
-import math
-from io import BytesIO
+import json
+import struct
 import cv2
-import mediapipe as mp
 import numpy as np
-from PIL import Image
-from flask import request, jsonify, Flask
+from flask import request, jsonify, Flask, Response, stream_with_context
 import dbConnectTemplate as dbtemp
+import emg_session
+import pose_pool
 import uuid
 from datetime import datetime
 import pytz
 import os
-
-from twilio.rest import Client
-
-account_sid = os.getenv("ACCOUNT_SID")
-auth_token = os.getenv("AUTH_TOKEN")
-client = Client(account_sid, auth_token)
+import threading
+import time
+from collections import OrderedDict
+import alert_outbox
+import model_registry
 
 
 # 전역 변수
 COORDINATE_SIZE = 33  # 저장(X, Y) 배열사이즈
 MOVE_DISTANCE = 0.35  # 움직인 거리
 EMG_PROB = 0.35 # 정확도
-
-mp_holistic = mp.solutions.holistic
-holistic = mp_holistic.Holistic(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-
-previous_X = np.zeros(COORDINATE_SIZE)  # 이전 X 좌표 배열
-previous_Y = np.zeros(COORDINATE_SIZE)  # 이전 Y 좌표 배열
-array_EMG = []
-
-dbtemp.oracle_init()
+DEBUG_DRAW = os.getenv("EMG_DEBUG_DRAW") == "1"  # 랜드마크 디버그 표시 여부
+FRAME_HEADER = struct.Struct(">I")  # 스트리밍 프레임 길이 헤더
+MAX_FRAME_BYTES = 5 * 1024 * 1024  # 스트리밍 프레임 최대 크기
+# 정지 화면 판정: 축소 흑백 이미지의 평균 화소 차이가 기준 이하이면 이전 포즈 결과를 재사용
+GATE_SIZE = (32, 24)
+GATE_THRESHOLD = float(os.getenv("EMG_GATE_THRESHOLD", 2.0))
+GATE_MAX_SKIP = int(os.getenv("EMG_GATE_MAX_SKIP", 10))  # 이 수만큼 건너뛰면 한 번은 추론
+
+# 포즈 모델 풀 (세션마다 같은 모델이 프레임을 순서대로 처리)
+pose_models = pose_pool.PosePool()
+model_registry.register("pose", pose_models.warm_up)
+
+# 위급 알림(전화/문자)은 outbox 에 저장한 뒤 백그라운드에서 발송
+alerts = alert_outbox.AlertOutbox()
+alert_dispatcher = alert_outbox.AlertDispatcher(alerts)
+
+# 회원 UUID -> (담당자 UUID, 만료 시각) LRU 캐시
+MANAGER_CACHE_TTL = 300
+MANAGER_CACHE_SIZE = 1024
+manager_cache = OrderedDict()
+manager_cache_lock = threading.Lock()
+
+# 세션(sessId/uuid)별 기준 좌표와 움직임 기록
+sessions = emg_session.EMGSessionStore(COORDINATE_SIZE)
 
 def register_routes(app) :
+    alert_dispatcher.start()
+
     @app.route('/emg/start', methods=['POST'])
     def emg_start():
         data = request.get_json()
@@ -46,83 +62,179 @@ def register_routes(app) :
         if not image_data_list:
             return jsonify({'message': '이미지가 제공되지 않았습니다.'}), 400
 
+        session = sessions.get(sessId or memUUID)
+
         # Base64로 전달된 이미지를 디코딩하여 처리
         images = []
         for image_data in image_data_list:
             if image_data:
                 # Base64로 전달된 이미지를 디코딩하여 처리
                 image_data = base64.b64decode(image_data.split(',')[1])  # 'data:image/jpeg;base64,' 제거
-                image = Image.open(BytesIO(image_data))
-                image = np.array(image)  # 이미지 배열로 변환
+                image = decode_frame(image_data)
+                if image is None:
+                    return jsonify({'message': '잘못된 이미지 형식입니다.'}), 400
                 images.append(image)
             else:
                 return jsonify({'message': '잘못된 이미지 형식입니다.'}), 40
-            # 이미지를 RGB로 변환
-
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-            # Holistic 모델 사용하여 랜드마크 추출
-            result = holistic.process(rgb_image)
-
-            isEMG = True
-            # 감지된 포즈의 랜드마크 그리기
-            if result.pose_landmarks:
 
-                for i in range(len(result.pose_landmarks.landmark)):
-                    landmark = result.pose_landmarks.landmark[i]
+        with session.lock:
+            # 화면 변화가 있는 프레임만 RGB로 변환하여 세션의 포즈 모델로 랜드마크 추출
+            infer = [needs_inference(session, image) for image in images]
+            rgb_images = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image, flag in zip(images, infer) if flag]
+            landmarks = iter(pose_models.process_batch(rgb_images, sessId or memUUID))
 
-                    # 랜드마크 좌표를 화면에 그리기
-                    h, w, _ = image.shape
-                    cx, cy = int(landmark.x * w), int(landmark.y * h)
-                    cv2.circle(image, (cx, cy), 5, (0, 255, 0), -1)  # 초록색 점으로 표시
+            # 입력 순서대로 움직임 판정 (건너뛴 프레임은 직전 추론 결과 재사용)
+            for image, flag in zip(images, infer):
+                coords = next(landmarks) if flag else session.last_coords
+                apply_frame(session, image, coords)
 
-                    distance = calculate_distance(landmark.x, landmark.y, previous_X[i], previous_Y[i])
-
-                    if distance > MOVE_DISTANCE:
-                        previous_X[i], previous_Y[i] = landmark.x, landmark.y
-
-                        isEMG = False
-
-            array_EMG.append(isEMG)
+            motion_flags = session.motion_flags()
 
         # 리소스 해제
-
-        cv2.destroyAllWindows()
-        print(array_EMG)
-        isEMG = probabilityEMG(array_EMG, memUUID, sessId)
+        if DEBUG_DRAW:
+            cv2.destroyAllWindows()
+        print(motion_flags)
+        isEMG = probabilityEMG(motion_flags, memUUID, sessId)
 
         return jsonify({"emgMSG": isEMG, "emgUUID": memUUID}), 200
 
     @app.route('/emg/end', methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     def emg_end():
-        global previous_X, previous_Y, array_EMG
-        previous_X = np.zeros(COORDINATE_SIZE)  # 이전 X 좌표 배열
-        previous_Y = np.zeros(COORDINATE_SIZE)  # 이전 Y 좌표 배열
-        array_EMG = []
-        print("초기화 완료")
+        if request.method == 'OPTIONS':
+            return jsonify("OK"), 200
+        data = request.get_json(silent=True) or request.args
+        key = data.get('sessId') or data.get('uuid')
+        # 다른 입소자의 세션까지 지우지 않도록 초기화할 세션을 반드시 지정해야 함
+        if not key:
+            return jsonify({'message': 'sessId 또는 uuid가 제공되지 않았습니다.'}), 400
+        sessions.reset(key)
+        print(f"초기화 완료 : {key}")
 
         return jsonify("초기화 완료."), 200
 
+    @app.route('/emg/stream', methods=['POST'])
+    def emg_stream():
+        """
+        바이너리 프레임 스트림을 받아 도착하는 대로 한 장씩 처리하고, 프레임별 판정을 바로 돌려줍니다.
+        - 요청 본문 : [4바이트 big-endian 길이][JPEG 바이트] 반복 (chunked 업로드 가능)
+        - 응답 : 프레임마다 {"frame", "isEMG"} 한 줄, 마지막에 {"emgMSG", "emgUUID"} 한 줄 (NDJSON)
+        """
+        memUUID = request.args.get('uuid')
+        sessId = request.args.get('sessId')
+        if not memUUID:
+            return jsonify({'message': 'uuid가 제공되지 않았습니다.'}), 400
+        session = sessions.get(sessId or memUUID)
+
+        def generate():
+            try:
+                for count, image_data in enumerate(read_frames(request.stream)):
+                    image = decode_frame(image_data)
+                    if image is None:
+                        yield json.dumps({'frame': count, 'message': '잘못된 이미지 형식입니다.'}) + "\n"
+                        continue
+                    with session.lock:
+                        if needs_inference(session, image):
+                            coords = pose_models.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), sessId or memUUID)
+                        else:
+                            coords = session.last_coords
+                        isEMG = apply_frame(session, image, coords)
+                    yield json.dumps({'frame': count, 'isEMG': isEMG}) + "\n"
+            except ValueError as e:
+                print(f"스트림 오류 : {e}")
+                yield json.dumps({'message': str(e)}) + "\n"
+
+            if DEBUG_DRAW:
+                cv2.destroyAllWindows()
+            with session.lock:
+                motion_flags = session.motion_flags()
+            emgMSG = probabilityEMG(motion_flags, memUUID, sessId)
+            yield json.dumps({'emgMSG': emgMSG, 'emgUUID': memUUID}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
     @app.route('/emg/cancel', methods=['POST'])
     def emg_cancel():
         data = request.get_json()
         memUUID = data.get('uuid')
-        updateEMG(memUUID)
+        if not updateEMG(memUUID):
+            return jsonify({'message': '위급 상황 처리 또는 알림 발송에 실패했습니다.'}), 500
         return jsonify("업데이트 완료."), 200
 
 
-def calculate_distance(x1, y1, x2, y2):
-    # 유클리드 거리 계산
-    distance = math.sqrt((x2 - x1)**2 + (y2 - y1)**2)
-    return distance
+def decode_frame(image_bytes):
+    """
+    JPEG/PNG 바이트를 복사 없이 BGR 이미지로 디코딩합니다. 실패하면 None 을 반환합니다.
+    """
+    return cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def read_frames(stream):
+    """
+    [4바이트 big-endian 길이][프레임 바이트] 형식의 스트림에서 프레임을 하나씩 읽어 반환합니다.
+    """
+    while True:
+        header = read_exact(stream, FRAME_HEADER.size)
+        if not header:
+            return
+        (length,) = FRAME_HEADER.unpack(header)
+        if length > MAX_FRAME_BYTES:
+            raise ValueError(f"Frame too large: {length} bytes")
+        frame = read_exact(stream, length)
+        if len(frame) < length:
+            return
+        yield frame
+
+def read_exact(stream, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def needs_inference(session, image):
+    """
+    축소 흑백 이미지로 직전 추론 프레임과의 차이를 계산하여 포즈 추론이 필요한지 판단합니다.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    thumbnail = cv2.resize(gray, GATE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+    return session.needs_inference(thumbnail, GATE_THRESHOLD, GATE_MAX_SKIP)
+
+def apply_frame(session, image, coords):
+    """
+    프레임 하나의 랜드마크로 세션의 움직임 상태를 갱신하고 판정(True: 움직임 없음)을 기록합니다.
+    세션 잠금을 잡은 상태에서 호출해야 합니다.
+    """
+    session.last_coords = coords
+    isEMG = True
+    if coords is not None:
+        isEMG = session.update(coords, MOVE_DISTANCE)
+        if DEBUG_DRAW:
+            draw_landmarks(image, coords)
+
+    session.record(isEMG)
+    return isEMG
+
+def draw_landmarks(image, coords):
+    """
+    디버그용: 랜드마크를 화면에 초록색 점으로 그려 표시합니다.
+    """
+    h, w = image.shape[:2]
+    for cx, cy in (coords * (w, h)).astype(int):
+        cv2.circle(image, (int(cx), int(cy)), 5, (0, 255, 0), -1)
+    cv2.imshow("EMG", image)
+    cv2.waitKey(1)
 
 def probabilityEMG(array, memUUID, sessId):
     """
     motion_history 배열을 받아 True와 False의 비율을 계산하여 출력하는 함수
     """
-    true_count = array.count(True)
-    false_count = array.count(False)
+    array = np.asarray(array, dtype=bool)
     total = len(array)
+    true_count = int(np.count_nonzero(array))
+    false_count = total - true_count
 
     print(f'array: {array}')
     print(f'memUUID: {memUUID}')
@@ -143,6 +255,30 @@ def probabilityEMG(array, memUUID, sessId):
             return "normal"
     else:
         print("모션 기록이 없습니다.")
+def get_manager_uuid(cursor, memUUID):
+    """
+    회원의 담당자 UUID(MEM_UUID_MGR)를 반환합니다.
+    최근 조회 결과는 MANAGER_CACHE_TTL 동안 캐시하여 같은 시설의 연속 위급 상황에 member 테이블을 반복 조회하지 않습니다.
+    """
+    now = time.monotonic()
+    with manager_cache_lock:
+        cached = manager_cache.get(memUUID)
+        if cached and cached[1] > now:
+            manager_cache.move_to_end(memUUID)
+            return cached[0]
+
+    # 바인드 변수를 사용하여 커서 문장 캐시를 재사용하고, 필요한 컬럼만 조회
+    cursor.execute("select MEM_UUID_MGR from member where MEM_UUID = :mem_uuid", mem_uuid=memUUID)
+    row = cursor.fetchone()
+    manager_uuid = row[0] if row and row[0] else ""
+
+    with manager_cache_lock:
+        manager_cache[memUUID] = (manager_uuid, now + MANAGER_CACHE_TTL)
+        manager_cache.move_to_end(memUUID)
+        while len(manager_cache) > MANAGER_CACHE_SIZE:
+            manager_cache.popitem(last=False)
+    return manager_uuid
+
 def insertEMG(memUUID, sessId):
 
     EMG_LOG_ID = str(uuid.uuid4())
@@ -162,20 +298,13 @@ def insertEMG(memUUID, sessId):
     # 현재 KST 시간 가져오기
     EMG_CREATED_AT = datetime.now(kst)
 
-    query = f"select * from member WHERE MEM_UUID = '{memUUID}'"
     conn = dbtemp.connect()
     cursor = conn.cursor()  # db 연결 정보로 커서 객체를 생성함
 
     try:
-        cursor.execute(query)  # 쿼리문을 db로 전송하고 실행한 결과를 커서가 받음
-
-        # 컬럼명 얻기
-        columns = [desc[0] for desc in cursor.description]
-
-        rows = cursor.fetchall()
-        for row in rows:
-            EMG_ALERT_SENT_TO = row[columns.index("MEM_UUID_MGR")]
-            print(f"EMG_ALERT_SENT_TO: {EMG_ALERT_SENT_TO}")
+        # 담당자 UUID 조회 (캐시에 없을 때만 DB 조회)
+        EMG_ALERT_SENT_TO = get_manager_uuid(cursor, memUUID)
+        print(f"EMG_ALERT_SENT_TO: {EMG_ALERT_SENT_TO}")
 
         tp_value = (EMG_LOG_ID, EMG_CAP_PATH, EMG_DETECTED_MOTION, EMG_ALERT_SENT_TO, EMG_CREATED_AT,
                     EMG_USER_UUID, EMG_CANCEL, EMG_CANCLE_AT, EMG_F_PHONE, EMG_S_PHONE, EMG_SESS_ID)
@@ -191,7 +320,7 @@ def insertEMG(memUUID, sessId):
         print(f"rollback error: {e}")
     finally:
         cursor.close()
-        conn.close()
+        dbtemp.close(conn)  # 풀에 반납
 
         return EMG_LOG_ID
 
@@ -211,24 +340,25 @@ def updateEMG(uuid):
         cursor.execute(query,tp_value)  # 쿼리문을 db로 전송하고 실행한 결과를 커서가 받음
         print(cursor.fetchall)
         dbtemp.commit(conn)
-        make_call()
     except Exception as e:
         dbtemp.rollback(conn)
         print(f"rollback error: {e}")
+        return False
     finally:
         cursor.close()
-        conn.close()
-
-
-def make_call():
-    print("전화와 문자를 보냈습니다.")
-    call = client.calls.create(
-        twiml="<Response><Say>The current guardian is in danger</Say></Response>",
-        to="+821052928302",
-        from_="+12298087476",
-    )
-    messages = client.messages.create(
-        to="+821052928302",
-        from_="+12298087476",
-        body="위급 상황입니다."
-    )
\ No newline at end of file
+        dbtemp.close(conn)  # 풀에 반납
+
+    # 커밋이 끝나면 알림을 outbox 에 저장하고 바로 응답 (발송은 디스패처가 처리)
+    try:
+        alert_outbox.enqueue_emergency_alert(alerts, uuid)
+        return True
+    except Exception as e:
+        print(f"알림 outbox 저장 실패, 바로 발송합니다 : {uuid} - {e}")
+
+    # outbox 에 저장하지 못하면 요청 안에서 바로 발송
+    try:
+        alert_outbox.send_emergency_alert(alert_outbox.create_client(), uuid)
+        return True
+    except Exception as e:
+        print(f"[ALERT LOST] 위급 상황 알림 발송 실패 : {uuid} - {e}")
+        return False
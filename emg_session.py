@@ -0,0 +1,104 @@
+import threading
+import time
+import numpy as np
+
+SESSION_TTL = 30 * 60  # 마지막 요청 후 세션을 유지하는 시간(초)
+HISTORY_SIZE = 300     # 세션별로 보관하는 최근 움직임 판정 수
+
+
+class EMGSession:
+    """
+    모니터링 세션 하나의 움직임 상태.
+    기준 좌표는 (랜드마크 수, 2) 배열, 움직임 판정은 고정 크기 링 버퍼에 보관합니다.
+    """
+    __slots__ = ("previous", "history", "count", "cursor", "touched_at", "lock",
+                 "reference", "last_coords", "skipped")
+
+    def __init__(self, landmark_count, history_size):
+        self.previous = np.zeros((landmark_count, 2), dtype=np.float32)  # 이전 (X, Y) 좌표
+        self.history = np.zeros(history_size, dtype=bool)  # True: 움직임 없음
+        self.count = 0
+        self.cursor = 0
+        self.touched_at = time.monotonic()
+        self.lock = threading.Lock()  # 같은 세션의 요청은 순서대로 처리
+        self.reference = None    # 마지막으로 포즈 추론한 프레임의 축소 흑백 이미지
+        self.last_coords = None  # 마지막 포즈 추론 결과
+        self.skipped = 0         # 마지막 추론 이후 건너뛴 프레임 수
+
+    def needs_inference(self, thumbnail, threshold, max_skip):
+        """
+        마지막으로 추론한 프레임과 비교하여 화면 변화가 threshold 이하이면 추론을 건너뜁니다.
+        변화가 없어도 max_skip 프레임마다 한 번은 추론합니다.
+        """
+        if (self.reference is None or self.skipped >= max_skip
+                or np.abs(thumbnail - self.reference).mean() > threshold):
+            self.reference = thumbnail
+            self.skipped = 0
+            return True
+        self.skipped += 1
+        return False
+
+    def update(self, coords, move_distance):
+        """
+        (랜드마크 수, 2) 좌표로 기준 좌표와의 이동 거리를 한 번에 계산합니다.
+        기준보다 move_distance 넘게 움직인 랜드마크는 기준 좌표를 갱신하고,
+        움직인 랜드마크가 하나도 없으면 True(움직임 없음)를 반환합니다.
+        """
+        moved = np.hypot(*(coords - self.previous).T) > move_distance
+        self.previous[moved] = coords[moved]
+        return not moved.any()
+
+    def record(self, is_emg):
+        self.history[self.cursor] = is_emg
+        self.cursor = (self.cursor + 1) % len(self.history)
+        self.count = min(self.count + 1, len(self.history))
+
+    def motion_flags(self):
+        """
+        기록된 판정을 오래된 것부터 순서대로 반환합니다.
+        """
+        if self.count < len(self.history):
+            return self.history[:self.count].copy()
+        return np.roll(self.history, -self.cursor)
+
+
+class EMGSessionStore:
+    """
+    sessId(없으면 uuid)별 EMGSession 저장소. 일정 시간 요청이 없는 세션은 제거합니다.
+    """
+
+    def __init__(self, landmark_count, history_size=HISTORY_SIZE, ttl=SESSION_TTL):
+        self.landmark_count = landmark_count
+        self.history_size = history_size
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        세션을 반환합니다. 없으면 새로 만듭니다.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(key)
+            if session is None:
+                session = EMGSession(self.landmark_count, self.history_size)
+                self._sessions[key] = session
+            session.touched_at = now
+            return session
+
+    def reset(self, key):
+        """
+        key 에 해당하는 세션을 초기화합니다.
+        """
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _evict(self, now):
+        expired = [key for key, session in self._sessions.items() if now - session.touched_at > self.ttl]
+        for key in expired:
+            del self._sessions[key]
+
+    def __len__(self):
+        return len(self._sessions)
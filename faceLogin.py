@@ -1,13 +1,16 @@
+import os
 from flask import Flask, request, jsonify, Blueprint
 from flask_cors import CORS
-from deepface import DeepFace
 import cv2
 import numpy as np
 import base64
 from io import BytesIO
-import tempfile
-import os
 import ftp_utility as ftp
+import face_ann
+import face_quality
+import face_sync
+import face_worker
+import model_registry
 
 # FTP 설정
 FTP_SERVER = "ktj0514.synology.me"
@@ -22,75 +25,48 @@ CORS(face_blueprint,
      resources={r"/*": {"origins": "http://localhost:3000"}},
      supports_credentials=True)
 
-def fetch_all_images_from_ftp():
-    ftputility = ftp.FTPUtility(FTP_SERVER, FTP_PORT, FTP_USERNAME, FTP_PASSWORD)
-    try:
-        ftputility.connect()
-        file_list = ftputility.list_files(FTP_REMOTE_DIR)
-        images = []
-        for file_name in file_list:
-            try:
-                corrected_path = f"{FTP_REMOTE_DIR}/{file_name}"
-                image_file = ftputility.open_file(corrected_path)
-                file_bytes = np.asarray(bytearray(image_file.read()), dtype=np.uint8)
-                img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-                images.append((file_name, img))
-            except Exception as e:
-                print(f"Error fetching file {file_name}: {e}")
-                continue
-        return images
-    except Exception as e:
-        print(f"Error fetching images from FTP: {e}")
-        return []
-    finally:
-        ftputility.disconnect()
+# 프로필 임베딩 인덱스 (디스크에 저장된 인덱스를 먼저 불러옴)
+profile_index = face_ann.create_index()
 
-def compare_face_with_all_profiles(camera_frame, profile_images, threshold_override=0.60):
-    best_match = None
-    best_distance = float('inf')
-    for file_name, profile_img in profile_images:
-        try:
-            temp_camera_path = save_temp_image(camera_frame)
-            temp_profile_path = save_temp_image(profile_img)
-            result = DeepFace.verify(
-                img1_path=temp_camera_path,
-                img2_path=temp_profile_path,
-                detector_backend='retinaface',
-                model_name='ArcFace'
-            )
-            distance = result['distance']
-            threshold = threshold_override
+# 얼굴 검출/임베딩 전담 워커 (동시 로그인 요청을 배치로 처리)
+embedding_worker = face_worker.EmbeddingWorker()
 
-            # 로그 출력 추가
-            print(f"Comparing with {file_name}: Distance = {distance}, Threshold = {threshold}")
+# NAS 프로필 디렉터리 증분 동기화 (로그인 요청은 FTP 에 접근하지 않음)
+profile_sync = face_sync.ProfileIndexSync(
+    profile_index, embedding_worker.embed,
+    ftp.get_utility(FTP_SERVER, FTP_PORT, FTP_USERNAME, FTP_PASSWORD), FTP_REMOTE_DIR
+)
 
-            if distance < threshold and distance < best_distance:
-                best_match = (file_name, distance)
-                best_distance = distance
-            delete_temp_file(temp_camera_path)
-            delete_temp_file(temp_profile_path)
-        except Exception as e:
-            print(f"Error comparing with {file_name}: {e}")
-            continue
-
-    # 0.4 이하인 경우만 반환
-    if best_match and best_distance <= threshold_override:
-        return best_match
-    return None
-
-def save_temp_image(img):
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    temp_file_path = temp_file.name
-    cv2.imwrite(temp_file_path, img)
-    return temp_file_path
+def compare_face_with_all_profiles(camera_frame, index, threshold_override=0.60):
+    """
+    카메라 프레임을 메모리에서 한 번만 검출/임베딩하고 프로필 인덱스에서 가장 가까운 얼굴을 찾습니다.
+    RetinaFace 가 얼굴을 찾지 못하면 FrameRejected("no_face") 를 발생시킵니다.
+    """
+    try:
+        embedding = embedding_worker.embed(camera_frame)
+    except ValueError as e:
+        raise face_quality.FrameRejected("no_face", f"No face detected ({e})")
+    return index.search(embedding, threshold_override)
 
-def delete_temp_file(file_path):
-    if os.path.exists(file_path):
-        os.remove(file_path)
+def sync_enabled():
+    """
+    시작할 때 프로필 동기화를 실행할지 정합니다.
+    FACE_SYNC 가 설정되어 있으면 그 값(1/true/yes)을, 아니면 MODEL_WARMUP 에 deepface 가 포함되었는지를 따릅니다.
+    그 외 워커는 처음 /compare 요청이 들어올 때 동기화를 시작합니다.
+    """
+    value = os.getenv("FACE_SYNC")
+    if value is not None:
+        return value.strip().lower() in ("1", "true", "yes")
+    return "deepface" in model_registry.warmup_names_from_env()
 
 def register_routes(app) :
+    if sync_enabled():
+        profile_sync.start()
+
     @app.route("/compare", methods=["POST"])
     def compare_faces():
+        # 얼굴 로그인을 처리하는 워커에서만 동기화가 돌도록 첫 요청에서 시작 (이미 실행 중이면 무시)
+        profile_sync.start()
         try:
             data = request.json
             image_data = data.get("image")
@@ -99,10 +75,18 @@ def register_routes(app) :
             image_bytes = base64.b64decode(image_data.split(",")[1])
             np_array = np.frombuffer(image_bytes, np.uint8)
             camera_frame = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
-            profile_images = fetch_all_images_from_ftp()
-            if not profile_images:
-                return jsonify({"error": "No profile images found on NAS"}), 404
-            best_match = compare_face_with_all_profiles(camera_frame, profile_images)
+            # 얼굴 없음/여러 명/흐림 등은 임베딩 전에 바로 거절
+            try:
+                face_quality.check_frame(camera_frame)
+                if len(profile_index) == 0:
+                    if not profile_sync.ready.is_set():
+                        return jsonify({"error": "Profile index is not ready yet"}), 503
+                    return jsonify({"error": "No profile images found on NAS"}), 404
+                best_match = compare_face_with_all_profiles(camera_frame, profile_index)
+            except face_quality.FrameRejected as e:
+                # 사전 필터를 통과했어도 RetinaFace 가 얼굴을 찾지 못하면 같은 no_face 로 응답
+                print(f"Frame rejected: {e.status} ({e.message})")
+                return jsonify({"best_match": None, "distance": None, "status": e.status, "error": e.message}), 422
             if best_match:
                 file_name, distance = best_match
                 return jsonify({"best_match": file_name, "distance": distance, "status": "success"})
@@ -0,0 +1,196 @@
+import os
+import time
+import numpy as np
+import face_store
+from face_index import FaceIndex, normalize, RELOAD_INTERVAL, STORE_DTYPE
+
+ANN_INDEX_PATH = os.path.join("processed", "face_ann")
+ANN_MIN_SIZE = 2000   # 이보다 적은 프로필은 전수 검색(exact)으로 처리
+NPROBE = 8            # 검색할 클러스터 수 (클수록 정확도↑, 속도↓)
+KMEANS_ITERATIONS = 20
+
+
+def kmeans(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    단위 벡터에 대한 구면 k-means 로 클러스터 중심(nlist, D)을 계산합니다.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # 비어 있는 클러스터는 임의의 벡터로 다시 시작
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        centroids = normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+class IVFFaceIndex(FaceIndex):
+    """
+    대규모 갤러리용 IVF(inverted file) 근사 최근접 이웃 인덱스.
+    임베딩을 k-means 클러스터로 나누고, 질의와 가까운 nprobe 개 클러스터만 검색합니다.
+    프로필 수가 min_size 미만이거나 아직 학습 전이면 FaceIndex 와 같은 전수 검색을 사용합니다.
+    임베딩은 face_store 형식, 클러스터 정보는 같은 세대 번호의 .npy 파일로 저장하며 모두 메모리 매핑하여 엽니다.
+    """
+
+    def __init__(self, path=ANN_INDEX_PATH, nprobe=NPROBE, min_size=ANN_MIN_SIZE):
+        super().__init__(path)
+        self.nprobe = nprobe
+        self.min_size = min_size
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._order = None    # 클러스터 순으로 정렬된 행 번호
+        self._offsets = None  # 클러스터별 _order 시작 위치
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def load(self):
+        store = face_store.open_store(self._file("index.store"))
+        if store is None:
+            return self
+        self._store = store
+        if store.embedding_version != self.version:
+            print("Face ANN index version mismatch, rebuilding")
+            return self
+        assignments = np.full(len(store.names), -1, dtype=np.int32)
+        centroids = None
+        # 클러스터 파일도 저장소와 같은 세대 번호의 파일을 사용 (매핑된 파일은 교체하지 않음)
+        centroids_path = face_store.generation_path(self._file("centroids.npy"), store.generation)
+        if os.path.exists(centroids_path):
+            centroids = np.load(centroids_path, mmap_mode="r")
+            saved = np.load(face_store.generation_path(self._file("assignments.npy"), store.generation),
+                            mmap_mode="r")
+            if len(saved) == len(store.names):
+                assignments = saved
+            else:
+                # 클러스터 배정 파일이 저장소와 어긋나면 다시 배정
+                assignments = np.argmax(store.matrix @ centroids.T, axis=1).astype(np.int32)
+        with self._lock:
+            self.names, self.matrix = store.names, store.matrix
+            self.assignments, self.centroids = assignments, centroids
+            self._order = None
+            self._modified = False
+        print(f"Face ANN index loaded: {len(self.names)} profiles (generation {store.generation})")
+        return self
+
+    def save(self):
+        with self._lock:
+            names, matrix = list(self.names), self.matrix
+            assignments, centroids = self.assignments, self.centroids
+            self._modified = False
+        os.makedirs(self.path, exist_ok=True)
+        # 클러스터 파일을 새 세대 이름으로 먼저 쓰고, 저장소 포인터를 마지막에 교체
+        generation = face_store.read_generation(self._file("index.store")) + 1
+        for file_name, array in (("centroids.npy", centroids), ("assignments.npy", assignments)):
+            path = self._file(file_name)
+            if centroids is not None:
+                face_store.write_data_file(face_store.generation_path(path, generation),
+                                           lambda f, array=array: np.save(f, np.asarray(array)))
+            face_store.remove_stale(path, generation)
+        face_store.write_store(self._file("index.store"), names, matrix, self.version,
+                               generation=generation, dtype=STORE_DTYPE)
+        if not self._modified:
+            self.load()
+
+    def train(self, nlist=None):
+        """
+        현재 임베딩으로 클러스터 중심을 학습하고 모든 행을 다시 배정합니다.
+        학습 중에도 검색은 기존 상태로 계속 처리됩니다.
+        """
+        with self._lock:
+            snapshot = np.array(self.matrix)
+        if len(snapshot) == 0:
+            return
+        nlist = nlist or max(1, min(len(snapshot), int(np.sqrt(len(snapshot)))))
+        centroids = kmeans(snapshot, nlist)
+        with self._lock:
+            self.centroids = centroids
+            self.assignments = np.argmax(self.matrix @ centroids.T, axis=1).astype(np.int32)
+            self._order = None
+            self._modified = True
+
+    def add(self, name, embedding):
+        embedding = normalize(np.asarray(embedding, dtype=np.float32)).reshape(1, -1)
+        with self._lock:
+            cluster = -1
+            if self.centroids is not None:
+                cluster = int(np.argmax(self.centroids @ embedding[0]))
+            if name in self.names:
+                # 기존 프로필의 임베딩이 바뀐 경우 교체 후 클러스터 재배정
+                row = self.names.index(name)
+                matrix, assignments = np.array(self.matrix), np.array(self.assignments)
+                matrix[row], assignments[row] = embedding[0], cluster
+            elif not self.names:
+                self.names = [name]
+                matrix, assignments = embedding, np.array([cluster], dtype=np.int32)
+            else:
+                self.names = self.names + [name]
+                matrix = np.vstack([self.matrix, embedding])
+                assignments = np.append(self.assignments, np.int32(cluster))
+            self.matrix, self.assignments = matrix, assignments
+            self._order = None
+            self._modified = True
+        if self.centroids is None and len(self) >= self.min_size:
+            self.train()
+
+    def remove(self, name):
+        with self._lock:
+            if name not in self.names:
+                return False
+            row = self.names.index(name)
+            self.names = self.names[:row] + self.names[row + 1:]
+            self.matrix = np.delete(self.matrix, row, axis=0)
+            self.assignments = np.delete(self.assignments, row)
+            self._order = None
+            self._modified = True
+            return True
+
+    def _inverted_lists(self):
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind="stable")
+            counts = np.bincount(self.assignments[self._order], minlength=len(self.centroids))
+            self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        return self._order, self._offsets
+
+    def search(self, embedding, threshold=0.60):
+        if time.monotonic() - self._checked_at > RELOAD_INTERVAL:
+            self.refresh()
+        with self._lock:
+            if self.centroids is None or len(self.names) < self.min_size:
+                exact = True
+            else:
+                exact = False
+                names, matrix, centroids = self.names, self.matrix, self.centroids
+                order, offsets = self._inverted_lists()
+        if exact:
+            return super().search(embedding, threshold)
+
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes])
+        if len(rows) == 0:
+            return None
+        distances = 1.0 - matrix[rows] @ query
+        best = int(np.argmin(distances))
+        distance = float(distances[best])
+        name = names[int(rows[best])]
+        print(f"Best candidate {name}: Distance = {distance}, Threshold = {threshold}")
+        if distance <= threshold:
+            return name, distance
+        return None
+
+
+def create_index():
+    """
+    환경 변수 FACE_INDEX_BACKEND 에 따라 프로필 인덱스를 생성합니다.
+    "ivf" 이면 근사 검색 인덱스(FACE_ANN_NPROBE 로 정확도/속도 조절), 그 외에는 전수 검색 인덱스를 사용합니다.
+    """
+    if os.getenv("FACE_INDEX_BACKEND", "exact") == "ivf":
+        return IVFFaceIndex(nprobe=int(os.getenv("FACE_ANN_NPROBE", NPROBE))).load()
+    return FaceIndex().load()
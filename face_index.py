@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+import cv2
+import numpy as np
+import face_store
+import model_registry
+
+# 얼굴 임베딩 설정
+MODEL_NAME = "ArcFace"
+DETECTOR_BACKEND = "retinaface"
+INDEX_PATH = os.path.join("processed", "face_index.store")
+# 임베딩 전처리가 바뀌면 올려서 기존 인덱스를 다시 만들도록 함
+EMBEDDING_VERSION = 3
+STORE_DTYPE = np.float16 if os.getenv("FACE_STORE_DTYPE") == "float16" else np.float32
+RELOAD_INTERVAL = 5  # 다른 프로세스가 교체한 저장소 파일을 확인하는 주기(초)
+
+
+def load_deepface():
+    """
+    DeepFace(TensorFlow)를 불러오고 ArcFace 모델을 미리 만들어 둡니다.
+    """
+    from deepface import DeepFace
+    DeepFace.build_model(MODEL_NAME)
+    return DeepFace
+
+
+model_registry.register("deepface", load_deepface)
+
+
+def detect_faces(img):
+    """
+    디코딩된 BGR 이미지(ndarray)에서 얼굴을 검출하여 정렬된 얼굴 목록을 반환합니다.
+    """
+    faces = model_registry.get("deepface").extract_faces(
+        img_path=img,
+        detector_backend=DETECTOR_BACKEND,
+        enforce_detection=False,
+        align=True
+    )
+    # 얼굴을 찾지 못하면 이미지 전체가 confidence 0 으로 반환되므로 제외
+    return [face for face in faces if face.get("confidence", 0) > 0]
+
+
+def _recognition_model():
+    """
+    ArcFace keras 모델을 반환합니다. (DeepFace 가 내부적으로 캐시함)
+    """
+    model = model_registry.get("deepface").build_model(MODEL_NAME)
+    return getattr(model, "model", model)
+
+
+def _prepare_face(face, target_h, target_w):
+    """
+    얼굴 이미지를 비율을 유지한 채 모델 입력 크기로 줄이고 남는 영역은 0 으로 채웁니다.
+    extract_faces 의 얼굴은 RGB 이므로 DeepFace.represent 와 같이 BGR 로 바꿔서 모델에 넣습니다.
+    """
+    face = face[:, :, ::-1]
+    h, w = face.shape[:2]
+    scale = min(target_h / h, target_w / w)
+    resized = cv2.resize(face, (max(1, int(w * scale)), max(1, int(h * scale))))
+    canvas = np.zeros((target_h, target_w, 3), dtype=np.float32)
+    top = (target_h - resized.shape[0]) // 2
+    left = (target_w - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return canvas
+
+
+def embed_faces(faces):
+    """
+    detect_faces 가 반환한 얼굴들을 한 번의 추론으로 ArcFace 임베딩(L2 정규화) 행렬로 변환합니다.
+    """
+    model = _recognition_model()
+    target_h, target_w = model.input_shape[1:3]
+    batch = np.stack([_prepare_face(face["face"], target_h, target_w) for face in faces])
+    embeddings = model.predict(batch, verbose=0)
+    return normalize(np.asarray(embeddings, dtype=np.float32))
+
+
+def embed_face(face):
+    """
+    얼굴 하나를 검출 과정 없이 ArcFace 임베딩으로 변환합니다.
+    """
+    return embed_faces([face])[0]
+
+
+def represent(img):
+    """
+    이미지 한 장에서 가장 확실한 얼굴을 검출하고 ArcFace 임베딩을 반환합니다.
+    """
+    faces = detect_faces(img)
+    if not faces:
+        raise ValueError("Face could not be detected")
+    return embed_face(max(faces, key=lambda face: face["confidence"]))
+
+
+def normalize(vectors):
+    """
+    벡터(또는 행렬의 각 행)를 단위 길이로 정규화합니다.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class FaceIndex:
+    """
+    프로필 이미지별 ArcFace 임베딩을 파일 이름으로 보관하는 인덱스.
+    임베딩은 (N, D) 행렬로 저장되며, 검색은 행렬곱 한 번으로 끝납니다.
+    디스크의 인덱스는 face_store 형식으로 memmap 하여 여러 워커가 페이지를 공유하고,
+    다른 프로세스(동기화 작업)가 새 버전으로 교체하면 검색 시 자동으로 다시 엽니다.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.version = EMBEDDING_VERSION
+        self.names = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._store = None
+        self._modified = False  # 저장되지 않은 변경이 있는지 여부
+        self._checked_at = 0.0
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def load(self):
+        """
+        디스크에 저장된 인덱스를 memmap 으로 엽니다. 파일이 없으면 빈 인덱스로 시작합니다.
+        """
+        store = face_store.open_store(self.path)
+        if store is None:
+            return self
+        if store.embedding_version != self.version:
+            print("Face index version mismatch, rebuilding")
+            self._store = store
+            return self
+        with self._lock:
+            self._store = store
+            self.names, self.matrix = store.names, store.matrix
+            self._modified = False
+        print(f"Face index loaded: {len(store.names)} profiles (generation {store.generation})")
+        return self
+
+    def refresh(self):
+        """
+        저장소 파일이 교체되었으면 다시 엽니다. 저장되지 않은 변경이 있으면 건너뜁니다.
+        """
+        self._checked_at = time.monotonic()
+        if self._modified or self._store is None and not os.path.exists(self.path):
+            return False
+        if self._store is not None and not self._store.changed():
+            return False
+        self.load()
+        return True
+
+    def save(self):
+        """
+        인덱스를 새 세대의 저장소 파일로 원자적으로 교체한 뒤 memmap 으로 다시 엽니다.
+        """
+        with self._lock:
+            names, matrix = list(self.names), self.matrix
+            self._modified = False
+        face_store.write_store(self.path, names, matrix, self.version, dtype=STORE_DTYPE)
+        if not self._modified:
+            self.load()
+
+    def add(self, name, embedding):
+        """
+        프로필 임베딩을 추가합니다. 같은 이름이 있으면 교체합니다.
+        """
+        embedding = normalize(np.asarray(embedding, dtype=np.float32)).reshape(1, -1)
+        with self._lock:
+            self._modified = True
+            if name in self.names:
+                # 검색 중인 행렬(또는 읽기 전용 memmap)을 직접 수정하지 않도록 복사 후 교체
+                matrix = np.array(self.matrix)
+                matrix[self.names.index(name)] = embedding[0]
+                self.matrix = matrix
+            elif not self.names:
+                self.names = [name]
+                self.matrix = embedding
+            else:
+                self.names = self.names + [name]
+                self.matrix = np.vstack([self.matrix, embedding])
+
+    def remove(self, name):
+        """
+        프로필 임베딩을 삭제합니다.
+        """
+        with self._lock:
+            if name not in self.names:
+                return False
+            row = self.names.index(name)
+            self.names = self.names[:row] + self.names[row + 1:]
+            self.matrix = np.delete(self.matrix, row, axis=0)
+            self._modified = True
+            return True
+
+    def search(self, embedding, threshold=0.60):
+        """
+        코사인 거리가 가장 작은 프로필을 찾아 (파일 이름, 거리)를 반환합니다.
+        threshold 이하인 경우만 반환하고, 없으면 None 을 반환합니다.
+        """
+        if time.monotonic() - self._checked_at > RELOAD_INTERVAL:
+            self.refresh()
+        with self._lock:
+            names, matrix = self.names, self.matrix
+        if not names:
+            return None
+        query = normalize(np.asarray(embedding, dtype=np.float32))
+        distances = 1.0 - matrix @ query
+        best = int(np.argmin(distances))
+        distance = float(distances[best])
+        print(f"Best candidate {names[best]}: Distance = {distance}, Threshold = {threshold}")
+        if distance <= threshold:
+            return names[best], distance
+        return None
@@ -0,0 +1,56 @@
+import cv2
+
+# 사전 필터 기준값
+CHECK_WIDTH = 320        # 검사용으로 줄일 가로 크기
+MIN_BRIGHTNESS = 40      # 평균 밝기(0~255) 하한
+MAX_BRIGHTNESS = 220     # 평균 밝기(0~255) 상한
+BLUR_THRESHOLD = 40.0    # 얼굴 영역 라플라시안 분산 하한 (낮을수록 흐림)
+MIN_FACE_SIZE = 40       # 검사용 이미지 기준 최소 얼굴 크기(px)
+
+_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+
+class FrameRejected(Exception):
+    """
+    임베딩 전에 걸러진 프레임. status 는 응답에 그대로 내려가는 사유 코드입니다.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def check_frame(frame):
+    """
+    비싼 RetinaFace/ArcFace 처리 전에 프레임을 빠르게 검사합니다.
+    얼굴이 없거나 여러 개이거나, 너무 어둡거나 밝거나 흐리면 FrameRejected 를 발생시킵니다.
+    """
+    if frame is None or frame.size == 0:
+        raise FrameRejected("invalid_image", "Image could not be decoded")
+
+    h, w = frame.shape[:2]
+    scale = min(1.0, CHECK_WIDTH / w)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale < 1.0:
+        gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+    brightness = float(gray.mean())
+    if brightness < MIN_BRIGHTNESS:
+        raise FrameRejected("too_dark", f"Image is too dark (brightness {brightness:.1f})")
+    if brightness > MAX_BRIGHTNESS:
+        raise FrameRejected("too_bright", f"Image is too bright (brightness {brightness:.1f})")
+
+    faces = _cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                      minSize=(MIN_FACE_SIZE, MIN_FACE_SIZE))
+    if len(faces) == 0:
+        raise FrameRejected("no_face", "No face detected")
+    if len(faces) > 1:
+        raise FrameRejected("multiple_faces", f"{len(faces)} faces detected")
+
+    x, y, fw, fh = faces[0]
+    sharpness = float(cv2.Laplacian(gray[y:y + fh, x:x + fw], cv2.CV_64F).var())
+    if sharpness < BLUR_THRESHOLD:
+        raise FrameRejected("blurry", f"Image is too blurry (sharpness {sharpness:.1f})")
+
+    return {"brightness": brightness, "sharpness": sharpness}
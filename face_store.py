@@ -0,0 +1,179 @@
+import json
+import os
+import re
+import struct
+import time
+import numpy as np
+
+# 파일 구조
+#   header : magic(8) | 형식 버전(u32) | dtype 코드(u32) | 세대(u64) | 임베딩 버전(u32) | 예약(u32)
+#            | 행 수(u64) | 차원(u64) | ID 테이블 길이(u64) | 행렬 시작 위치(u64)
+#   ID 테이블 : 파일 이름 목록(JSON, UTF-8)
+#   행렬 : (행 수, 차원) float16/float32, ALIGNMENT 바이트 정렬
+# 세대마다 "<path>.<세대 12자리>" 파일에 저장하고, <path> 에는 현재 세대 파일 이름만 기록합니다.
+# (Windows 는 메모리 매핑된 파일을 교체할 수 없으므로 매핑된 파일은 덮어쓰지 않고 작은 포인터 파일만 교체)
+MAGIC = b"FACESTOR"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQIIQQQQ")
+ALIGNMENT = 64
+DTYPES = {1: np.float16, 2: np.float32}
+DTYPE_CODES = {np.dtype(dtype): code for code, dtype in DTYPES.items()}
+REPLACE_RETRIES = 20      # 다른 프로세스가 포인터 파일을 읽는 중이라 교체가 거부될 때 재시도 횟수 (Windows)
+REPLACE_RETRY_DELAY = 0.05
+
+
+class FaceStore:
+    """
+    np.memmap 으로 연 읽기 전용 임베딩 저장소.
+    여러 워커 프로세스가 같은 파일을 열면 페이지 캐시를 공유하므로 워커당 메모리가 늘지 않습니다.
+    """
+
+    def __init__(self, path, data_path, names, matrix, generation, embedding_version):
+        self.path = path
+        self.data_path = data_path
+        self.names = names
+        self.matrix = matrix
+        self.generation = generation
+        self.embedding_version = embedding_version
+
+    def changed(self):
+        """
+        포인터 파일이 새 세대를 가리키는지 확인합니다.
+        """
+        data_path = current_data_path(self.path)
+        return data_path is not None and data_path != self.data_path
+
+
+def generation_path(path, generation):
+    """
+    세대별 파일 경로를 반환합니다. (예: face_index.store.000000000003)
+    """
+    return f"{path}.{generation:012d}"
+
+
+def current_data_path(path):
+    """
+    포인터 파일이 가리키는 현재 세대 파일 경로를 반환합니다. 파일이 없으면 None 입니다.
+    이전 형식(포인터 없이 저장소 하나)이면 path 를 그대로 반환합니다.
+    """
+    try:
+        with open(path, "rb") as f:
+            content = f.read(256)
+    except FileNotFoundError:
+        return None
+    if content.startswith(MAGIC):
+        return path
+    name = content.decode("utf-8").strip()
+    return os.path.join(os.path.dirname(path), name) if name else None
+
+
+def _replace(src, dst):
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            # Windows 에서는 다른 프로세스가 잠깐 열고 있는 파일을 교체할 수 없음
+            if attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(REPLACE_RETRY_DELAY)
+
+
+def remove_stale(path, keep_generation):
+    """
+    keep_generation 과 그 직전 세대를 제외한 세대별 파일을 삭제합니다.
+    (직전 세대는 포인터를 읽고 아직 열기 전인 프로세스를 위해 남겨 둠)
+    다른 프로세스가 아직 매핑하고 있어 지울 수 없는 파일(Windows)은 다음 저장 때 다시 시도합니다.
+    """
+    directory = os.path.dirname(path) or "."
+    pattern = re.compile(re.escape(os.path.basename(path)) + r"\.(\d{12})$")
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match and int(match.group(1)) < keep_generation - 1:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def write_data_file(path, data):
+    """
+    임시 파일에 쓴 뒤 path 로 옮깁니다. path 는 새 세대 파일 이름이므로 매핑된 파일을 덮어쓰지 않습니다.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        data(f)
+        f.flush()
+        os.fsync(f.fileno())
+    _replace(temp_path, path)
+
+
+def write_store(path, names, matrix, embedding_version, generation=None, dtype=np.float32):
+    """
+    새 세대 파일에 저장한 뒤 포인터 파일을 os.replace 로 원자적으로 교체합니다.
+    기존 세대를 memmap 으로 열고 있는 워커는 교체 전 내용을 그대로 계속 읽습니다.
+    """
+    dtype = np.dtype(dtype)
+    matrix = np.ascontiguousarray(matrix, dtype=dtype)
+    rows = len(names)
+    dim = matrix.shape[1] if matrix.ndim == 2 and rows else 0
+    if generation is None:
+        generation = read_generation(path) + 1
+    id_table = json.dumps(list(names), ensure_ascii=False).encode("utf-8")
+    matrix_offset = -(-(HEADER.size + len(id_table)) // ALIGNMENT) * ALIGNMENT
+
+    def write(f):
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], generation, embedding_version, 0,
+                            rows, dim, len(id_table), matrix_offset))
+        f.write(id_table)
+        f.write(b"\0" * (matrix_offset - HEADER.size - len(id_table)))
+        if rows:
+            f.write(matrix.tobytes())
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data_path = generation_path(path, generation)
+    write_data_file(data_path, write)
+    write_data_file(path, lambda f: f.write(os.path.basename(data_path).encode("utf-8")))
+    remove_stale(path, generation)
+    return generation
+
+
+def read_generation(path):
+    """
+    저장소의 현재 세대 번호를 반환합니다. 파일이 없거나 깨져 있으면 0 입니다.
+    """
+    data_path = current_data_path(path)
+    if data_path is None:
+        return 0
+    try:
+        with open(data_path, "rb") as f:
+            header = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    return header[3] if header[0] == MAGIC else 0
+
+
+def open_store(path):
+    """
+    저장소의 현재 세대 파일을 열어 FaceStore 를 반환합니다. 파일이 없으면 None 을 반환합니다.
+    """
+    data_path = current_data_path(path)
+    if data_path is None or not os.path.exists(data_path):
+        return None
+    with open(data_path, "rb") as f:
+        (magic, format_version, dtype_code, generation, embedding_version, _,
+         rows, dim, id_table_size, matrix_offset) = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported face store file: {data_path}")
+        names = json.loads(f.read(id_table_size).decode("utf-8"))
+        dtype = DTYPES[dtype_code]
+        if not rows:
+            matrix = np.zeros((0, 0), dtype=dtype)
+        elif data_path == path:
+            # 이전 형식 파일은 포인터 파일로 교체될 것이므로 매핑하지 않고 메모리로 읽음
+            f.seek(matrix_offset)
+            matrix = np.frombuffer(f.read(rows * dim * np.dtype(dtype).itemsize), dtype=dtype).reshape(rows, dim)
+        else:
+            # 세대 파일은 교체되지 않으므로 그대로 매핑
+            matrix = np.memmap(f, dtype=dtype, mode="r", offset=matrix_offset, shape=(rows, dim))
+    return FaceStore(path, data_path, names, matrix, generation, embedding_version)
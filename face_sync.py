@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 에서는 프로세스 간 잠금 없이 항상 동기화
+    fcntl = None
+
+MANIFEST_PATH = os.path.join("processed", "face_index_manifest.json")
+SYNC_INTERVAL = 60  # NAS 동기화 주기(초)
+
+
+class ProfileIndexSync:
+    """
+    NAS 프로필 디렉터리와 얼굴 임베딩 인덱스를 증분 동기화하는 백그라운드 작업.
+    파일 이름/크기/수정 시각을 로컬 manifest 와 비교하여
+    새로 추가되거나 변경된 이미지만 내려받아 임베딩하고, 삭제된 이미지는 인덱스에서 제거합니다.
+    """
+
+    def __init__(self, index, embed, storage, remote_dir,
+                 manifest_path=MANIFEST_PATH, interval=SYNC_INTERVAL):
+        self.index = index
+        self.embed = embed  # 디코딩된 이미지(ndarray) -> 임베딩
+        self.storage = storage  # FTPUtility 또는 호환 구현 (ftp_utility.get_utility)
+        self.remote_dir = remote_dir
+        self.manifest_path = manifest_path
+        self.interval = interval
+        self.manifest = self._load_manifest()
+        self.ready = threading.Event()  # 최초 동기화 완료 여부
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._leader_file = None
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            # 인덱스 형식이 바뀌었으면 모든 프로필을 다시 임베딩
+            if manifest.get("version") != self.index.version:
+                return {}
+            return manifest["files"]
+        except Exception as e:
+            print(f"Error loading face index manifest: {e}")
+            return {}
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.index.version, "files": self.manifest}, f, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
+
+    def _acquire_leader(self):
+        """
+        여러 워커 프로세스 중 하나만 동기화하도록 잠금 파일을 잡습니다.
+        나머지 워커는 동기화 작업이 교체한 저장소 파일을 다시 열기만 합니다.
+        """
+        if fcntl is None or self._leader_file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        leader_file = open(f"{self.manifest_path}.lock", "a")
+        try:
+            fcntl.flock(leader_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            leader_file.close()
+            return False
+        self._leader_file = leader_file
+        # 이전 동기화 작업이 남긴 최신 상태에서 이어서 동기화
+        self.index.load()
+        self.manifest = self._load_manifest()
+        return True
+
+    def sync_once(self):
+        """
+        NAS 디렉터리를 한 번 동기화하고 (추가/변경 수, 삭제 수)를 반환합니다.
+        """
+        with self._sync_lock:
+            if not self._acquire_leader():
+                self.index.refresh()
+                if len(self.index):
+                    self.ready.set()
+                return 0, 0
+            try:
+                remote = self.storage.stat_files(self.remote_dir)
+
+                changed = [
+                    name for name, (size, modified) in remote.items()
+                    if self.manifest.get(name) != {"size": size, "modified": modified}
+                ]
+                removed = [name for name in self.manifest if name not in remote]
+            finally:
+                self.storage.disconnect()
+
+            # 변경된 이미지는 접속 풀로 동시에 내려받음
+            paths = {f"{self.remote_dir}/{file_name}": file_name for file_name in changed}
+            for path, data in self.storage.fetch_many(paths):
+                file_name = paths[path]
+                size, modified = remote[file_name]
+                try:
+                    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                    self.index.add(file_name, self.embed(img))
+                    print(f"Indexed profile: {file_name}")
+                except Exception as e:
+                    # 얼굴이 없는 이미지 등은 manifest 에만 기록하여 변경 전까지 다시 받지 않음
+                    self.index.remove(file_name)
+                    print(f"Error indexing {file_name}: {e}")
+                # 다운로드에 실패한 파일은 manifest 에 남기지 않아 다음 주기에 다시 시도함
+                self.manifest[file_name] = {"size": size, "modified": modified}
+
+            for file_name in removed:
+                self.index.remove(file_name)
+                del self.manifest[file_name]
+                print(f"Evicted profile: {file_name}")
+
+            if changed or removed:
+                self.index.save()
+                self._save_manifest()
+            self.ready.set()
+            return len(changed), len(removed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"Error syncing profile index: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """
+        백그라운드 동기화 스레드를 시작합니다.
+        """
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profile-index-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
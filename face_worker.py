@@ -0,0 +1,55 @@
+import face_index
+from micro_batch import MicroBatcher
+
+MAX_BATCH = 8        # 한 번에 임베딩할 최대 프레임 수
+MAX_WAIT = 0.005     # 배치를 모으기 위해 기다리는 최대 시간(초)
+
+
+def embed_frames(frames):
+    """
+    프레임마다 가장 확실한 얼굴을 검출하고, 검출된 얼굴들을 한 번의 배치 추론으로 임베딩합니다.
+    얼굴이 없거나 실패한 프레임의 결과는 예외 객체입니다.
+    """
+    results = [None] * len(frames)
+    faces, positions = [], []
+    for position, frame in enumerate(frames):
+        try:
+            detected = face_index.detect_faces(frame)
+            if not detected:
+                raise ValueError("Face could not be detected")
+            faces.append(max(detected, key=lambda face: face["confidence"]))
+            positions.append(position)
+        except Exception as e:
+            results[position] = e
+    if faces:
+        try:
+            for position, embedding in zip(positions, face_index.embed_faces(faces)):
+                results[position] = embedding
+        except Exception as e:
+            print(f"Error embedding face batch: {e}")
+            for position in positions:
+                results[position] = e
+    return results
+
+
+class EmbeddingWorker:
+    """
+    얼굴 검출/임베딩을 전담하는 단일 워커 스레드.
+    요청 스레드는 submit() 으로 프레임을 넘기고 Future 로 결과를 기다리며,
+    워커는 잠깐 동안 모인 프레임들을 검출한 뒤 한 번의 배치 추론으로 임베딩합니다.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self._batcher = MicroBatcher(embed_frames, max_batch, max_wait, name="face-embedding-worker")
+
+    def submit(self, frame):
+        """
+        BGR 프레임을 큐에 넣고 임베딩 결과를 받을 Future 를 반환합니다.
+        """
+        return self._batcher.submit(frame)
+
+    def embed(self, frame, timeout=None):
+        """
+        프레임의 얼굴 임베딩을 반환합니다. 얼굴이 없으면 ValueError 가 발생합니다.
+        """
+        return self.submit(frame).result(timeout)
@@ -1,14 +1,144 @@
-from ftplib import FTP
+from ftplib import FTP, error_perm, all_errors
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import io
+import os
+import queue
+import shutil
+import threading
+import time
+
+POOL_MAX_SIZE = 4       # 서버별 최대 동시 접속 수
+KEEPALIVE_INTERVAL = 30  # 이 시간(초) 이상 쉬었던 세션은 NOOP 으로 확인 후 재사용
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def to_ftp_path(path):
+    """
+    ftplib 은 명령을 latin-1 로 보내므로, UTF-8 경로(한글 파일 이름 등)를 latin-1 문자열로 바꿔서 전달합니다.
+    """
+    return path.encode('utf-8').decode('latin-1')
+
+
+class FTPConnectionPool:
+    """
+    로그인된 FTP 세션을 재사용하는 크기 제한 풀.
+    오래 쉬었던 세션은 NOOP 으로 살아 있는지 확인하고, 끊긴 세션은 새로 연결합니다.
+    """
+
+    def __init__(self, server, port, username, password, max_size=POOL_MAX_SIZE,
+                 keepalive=KEEPALIVE_INTERVAL):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.keepalive = keepalive
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _open(self):
+        conn = FTP()
+        conn.connect(self.server, self.port)
+        conn.login(self.username, self.password)
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except all_errors:
+            pass
+
+    def acquire(self):
+        """
+        세션을 하나 빌려옵니다. 사용 후 반드시 release 로 반납해야 합니다.
+        """
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if time.monotonic() - last_used < self.keepalive:
+                    return conn
+                try:
+                    conn.voidcmd("NOOP")
+                    return conn
+                except all_errors:
+                    self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        """
+        세션을 반납합니다. 오류가 난 세션은 닫고 버립니다.
+        """
+        try:
+            if broken:
+                self._discard(conn)
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def retrieve(self, remote_path, retries=1):
+        """
+        풀의 세션으로 파일을 내려받아 bytes 로 반환합니다.
+        세션이 끊겨 실패하면 새 세션으로 다시 시도합니다.
+        """
+        for attempt in range(retries + 1):
+            conn = self.acquire()
+            broken = False
+            try:
+                file_data = io.BytesIO()
+                conn.retrbinary(f"RETR {to_ftp_path(remote_path)}", file_data.write)
+                return file_data.getvalue()
+            except error_perm:
+                # 파일이 없는 등 서버가 거절한 경우는 재시도하지 않음 (세션은 정상)
+                raise
+            except all_errors:
+                broken = True
+                if attempt == retries:
+                    raise
+            except BaseException:
+                # 예상하지 못한 오류는 세션 상태를 알 수 없으므로 버림
+                broken = True
+                raise
+            finally:
+                # 어떤 경우에도 풀 슬롯을 반납
+                self.release(conn, broken=broken)
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                conn.quit()
+            except all_errors:
+                self._discard(conn)
+
+
+def get_pool(server, port, username, password):
+    """
+    서버/계정별로 공유되는 접속 풀을 반환합니다.
+    """
+    key = (server, port, username, password)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = FTPConnectionPool(server, port, username, password)
+        return _pools[key]
+
 
 class FTPUtility:
-    ftp = FTP()
-    ftp.set_debuglevel(2)  # 디버깅 레벨 설정
-    ftp.connect("ktj0514.synology.me", 21)
-    ftp.login("anonymous", "")
-    ftp.cwd("files/member/profile")
-    ftp.retrlines("LIST")
-    ftp.quit()
+    """
+    NAS(FTP) 파일 접근 유틸리티.
+    객체를 만들 때는 접속하지 않으며, connect() 를 호출하거나 처음 파일에 접근할 때 접속합니다.
+    """
 
     def __init__(self, server, port, username, password):
         self.server = server
@@ -16,14 +146,21 @@ class FTPUtility:
         self.username=username
         self.password=password
         self.ftp=None
+        self.pool = get_pool(server, port, username, password)
 
     def connect(self):
-        self.ftp=FTP()
-        self.ftp.connect(self.server, self.port)
-        self.ftp.login(self.username, self.password)
+        ftp = FTP()
+        ftp.connect(self.server, self.port)
+        ftp.login(self.username, self.password)
+        self.ftp = ftp
         print(f"Connected to FTP server: {self.server}")
 
+    def _ensure_connected(self):
+        if self.ftp is None:
+            self.connect()
+
     def list_files(self, remote_dir):
+        self._ensure_connected()
         self.ftp.cwd(remote_dir)
         files = self.ftp.nlst()
         # 숨김 파일 필터링 및 디코딩
@@ -32,11 +169,39 @@ class FTPUtility:
         ]
         return decoded_files
 
+    def stat_files(self, remote_dir):
+        """
+        디렉터리의 파일별 (크기, 수정 시각)을 조회합니다.
+        MLSD 를 지원하지 않는 서버는 SIZE/MDTM 명령으로 하나씩 조회합니다.
+        """
+        self._ensure_connected()
+        self.ftp.cwd(remote_dir)
+        stats = {}
+        try:
+            for f, facts in self.ftp.mlsd(facts=["type", "size", "modify"]):
+                if facts.get("type") != "file" or f.startswith("._"):
+                    continue
+                name = f.encode('latin-1').decode('utf-8', 'ignore')
+                stats[name] = (int(facts.get("size", -1)), facts.get("modify", ""))
+            return stats
+        except error_perm:
+            pass
+
+        self.ftp.voidcmd("TYPE I")  # SIZE 명령은 바이너리 모드에서만 동작
+        for f in self.ftp.nlst():
+            if f.startswith("._"):
+                continue
+            name = f.encode('latin-1').decode('utf-8', 'ignore')
+            size = self.ftp.size(f)
+            modified = self.ftp.sendcmd(f"MDTM {f}").split()[-1]
+            stats[name] = (size if size is not None else -1, modified)
+        return stats
 
     def download_file(self, remote_path, local_path):
         try:
+            self._ensure_connected()
             # 경로와 파일 이름 UTF-8 변환
-            corrected_remote_path = remote_path.encode('utf-8').decode('latin-1')
+            corrected_remote_path = to_ftp_path(remote_path)
             print(f"다운로드 경로: {corrected_remote_path}")
 
             with open(local_path, 'wb') as file:
@@ -51,7 +216,11 @@ class FTPUtility:
 
     def disconnect(self):
         if self.ftp:
-            self.ftp.quit()
+            ftp, self.ftp = self.ftp, None
+            try:
+                ftp.quit()
+            except all_errors:
+                ftp.close()
             print("Disconnect from FTP server")
 
     def open_file(self, remote_path):
@@ -60,6 +229,7 @@ class FTPUtility:
         """
         try:
             print(f"Fetching file: {remote_path}")
+            self._ensure_connected()
             file_data = io.BytesIO()
 
             # 파일 다운로드
@@ -69,3 +239,117 @@ class FTPUtility:
         except Exception as e:
             print(f"Error while fetching file: {e}")
             raise
+
+    def fetch_many(self, remote_paths, max_workers=POOL_MAX_SIZE):
+        """
+        여러 파일을 풀의 세션들로 동시에 내려받아, 끝나는 순서대로 (경로, bytes)를 돌려줍니다.
+        실패한 파일은 로그만 남기고 건너뜁니다.
+        """
+        remote_paths = list(remote_paths)
+        if not remote_paths:
+            return
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(remote_paths))) as executor:
+            futures = {executor.submit(self.pool.retrieve, path): path for path in remote_paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    print(f"Error while fetching file {path}: {e}")
+
+
+class LocalDirUtility:
+    """
+    로컬 디렉터리를 NAS 대신 사용하는 FTPUtility 호환 구현 (개발/테스트용).
+    원격 경로는 root 아래의 상대 경로로 해석합니다.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, remote_path):
+        return os.path.join(self.root, remote_path.lstrip("/"))
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def list_files(self, remote_dir):
+        return sorted(self.stat_files(remote_dir))
+
+    def stat_files(self, remote_dir):
+        local_dir = self._path(remote_dir)
+        stats = {}
+        for name in os.listdir(local_dir):
+            path = os.path.join(local_dir, name)
+            if name.startswith("._") or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            stats[name] = (st.st_size, time.strftime("%Y%m%d%H%M%S", time.gmtime(st.st_mtime)))
+        return stats
+
+    def download_file(self, remote_path, local_path):
+        shutil.copyfile(self._path(remote_path), local_path)
+
+    def open_file(self, remote_path):
+        with open(self._path(remote_path), "rb") as f:
+            return io.BytesIO(f.read())
+
+    def fetch_many(self, remote_paths, max_workers=POOL_MAX_SIZE):
+        for path in remote_paths:
+            try:
+                yield path, self.open_file(path).getvalue()
+            except OSError as e:
+                print(f"Error while fetching file {path}: {e}")
+
+
+class MemoryUtility(LocalDirUtility):
+    """
+    {원격 경로: bytes} 딕셔너리를 NAS 대신 사용하는 FTPUtility 호환 구현 (테스트용).
+    """
+
+    def __init__(self, files=None):
+        super().__init__("/")
+        self.files = {"/" + path.lstrip("/"): data for path, data in (files or {}).items()}
+        self.modified = {path: time.strftime("%Y%m%d%H%M%S", time.gmtime()) for path in self.files}
+
+    def put(self, remote_path, data):
+        remote_path = "/" + remote_path.lstrip("/")
+        self.files[remote_path] = data
+        self.modified[remote_path] = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+
+    def delete(self, remote_path):
+        remote_path = "/" + remote_path.lstrip("/")
+        self.files.pop(remote_path, None)
+        self.modified.pop(remote_path, None)
+
+    def stat_files(self, remote_dir):
+        prefix = "/" + remote_dir.strip("/") + "/"
+        return {
+            path[len(prefix):]: (len(data), self.modified[path])
+            for path, data in self.files.items()
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        }
+
+    def download_file(self, remote_path, local_path):
+        with open(local_path, "wb") as f:
+            f.write(self.open_file(remote_path).getvalue())
+
+    def open_file(self, remote_path):
+        remote_path = "/" + remote_path.lstrip("/")
+        if remote_path not in self.files:
+            raise FileNotFoundError(remote_path)
+        return io.BytesIO(self.files[remote_path])
+
+
+def get_utility(server, port, username, password):
+    """
+    NAS 접근 유틸리티를 생성합니다.
+    환경 변수 NAS_LOCAL_DIR 이 설정되어 있으면 FTP 대신 해당 로컬 디렉터리를 사용합니다.
+    """
+    local_dir = os.getenv("NAS_LOCAL_DIR")
+    if local_dir:
+        return LocalDirUtility(local_dir)
+    return FTPUtility(server, port, username, password)
@@ -6,6 +6,7 @@ import faceLogin
 import stt
 import tts
 import emg
+import model_registry
 
 app = Flask(__name__)
 
@@ -21,6 +22,11 @@ stt.register_routes(app)
 tts.register_routes(app)
 emg.register_routes(app)
 faceLogin.register_routes(app)
+model_registry.register_routes(app)
+
+# 모델은 처음 사용할 때 로드하며, MODEL_WARMUP 에 지정한 모델만 백그라운드에서 미리 로드
+# 예) 채팅 워커 MODEL_WARMUP=sentiment, 얼굴 로그인 워커 MODEL_WARMUP=deepface, EMG 워커 MODEL_WARMUP=pose
+model_registry.warm_up_from_env()
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
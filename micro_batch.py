@@ -0,0 +1,72 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    요청을 잠깐 모아서 한 번에 처리하는 단일 워커 스레드.
+    요청 스레드는 submit() 으로 항목을 넘기고 Future 로 결과를 기다리며,
+    워커는 max_wait 동안(최대 max_batch 개) 모인 항목을 batch_fn 한 번으로 처리합니다.
+
+    batch_fn 은 항목 목록을 받아 같은 길이의 결과 목록을 반환합니다.
+    결과가 예외 객체이면 해당 항목의 Future 에 예외로 전달되고,
+    batch_fn 자체가 예외를 발생시키면 배치의 모든 Future 에 전달됩니다.
+    """
+
+    def __init__(self, batch_fn, max_batch, max_wait, name="micro-batch-worker"):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """
+        항목을 큐에 넣고 결과를 받을 Future 를 반환합니다.
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(item, future) for item, future in self._collect()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as e:
+                print(f"Error in {self.name} batch: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,113 @@
+import os
+import threading
+from flask import jsonify
+
+_loaders = {}
+_models = {}
+_errors = {}
+_loading = set()
+_locks = {}
+_registry_lock = threading.Lock()
+_warmup_targets = set()  # /ready 가 준비 완료를 확인할 모델
+
+
+def register(name, loader):
+    """
+    모델 로더를 등록합니다. 모델은 get() 으로 처음 사용할 때(또는 warm_up 시) 한 번만 로드됩니다.
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    """
+    로드된 모델을 반환합니다. 아직 로드되지 않았으면 지금 로드합니다.
+    """
+    if name in _models:
+        return _models[name]
+    with _locks[name]:
+        if name not in _models:
+            _loading.add(name)
+            try:
+                _models[name] = _loaders[name]()
+                _errors.pop(name, None)
+                print(f"[MODEL] {name} 로드 완료")
+            except Exception as e:
+                _errors[name] = str(e)
+                print(f"[MODEL] {name} 로드 실패: {e}")
+                raise
+            finally:
+                _loading.discard(name)
+    return _models[name]
+
+
+def status():
+    """
+    등록된 모델별 상태(ready / loading / error / not_loaded)를 반환합니다.
+    """
+    result = {}
+    for name in list(_loaders):
+        if name in _models:
+            result[name] = "ready"
+        elif name in _loading:
+            result[name] = "loading"
+        elif name in _errors:
+            result[name] = "error"
+        else:
+            result[name] = "not_loaded"
+    return result
+
+
+def warm_up(names=None):
+    """
+    지정한 모델(없으면 등록된 전체)을 백그라운드 스레드에서 미리 로드합니다.
+    """
+    names = [name for name in (names or list(_loaders)) if name in _loaders]
+    _warmup_targets.update(names)
+
+    def load_all():
+        for name in names:
+            try:
+                get(name)
+            except Exception:
+                continue
+
+    thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_names_from_env():
+    """
+    환경 변수 MODEL_WARMUP 에 지정된 모델 이름 목록을 반환합니다.
+    "all" 이면 등록된 전체, 쉼표로 구분한 이름이면 해당 모델, 지정하지 않으면 빈 목록입니다.
+    """
+    value = os.getenv("MODEL_WARMUP", "").strip()
+    if not value:
+        return []
+    if value == "all":
+        return list(_loaders)
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def warm_up_from_env():
+    """
+    환경 변수 MODEL_WARMUP 에 지정한 모델만 워밍업합니다.
+    지정하지 않으면(기본값) 워밍업하지 않고 처음 사용할 때 로드하므로, 모델을 쓰지 않는 워커는 메모리를 차지하지 않습니다.
+    """
+    names = warmup_names_from_env()
+    if not names:
+        return None
+    return warm_up(names)
+
+
+def register_routes(app):
+    @app.route("/ready", methods=["GET"])
+    def ready():
+        """
+        워밍업 대상 모델이 모두 로드되었으면 200, 아니면 503 을 반환합니다.
+        """
+        models = status()
+        is_ready = all(models.get(name) == "ready" for name in _warmup_targets)
+        return jsonify({"status": "ready" if is_ready else "loading", "models": models}), 200 if is_ready else 503
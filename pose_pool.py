@@ -0,0 +1,109 @@
+import os
+import threading
+import zlib
+import cv2
+import numpy as np
+
+POOL_SIZE = int(os.getenv("EMG_POSE_WORKERS", os.cpu_count() or 1))  # 포즈 모델 수 (동시에 처리하는 세션 수)
+# 포즈 모델 설정
+#   EMG_POSE_BACKEND     : "holistic"(얼굴/손 포함) 또는 "pose"(포즈 전용, 더 가벼움)
+#   EMG_MODEL_COMPLEXITY : 0(가장 빠름) ~ 2(가장 정확)
+#   EMG_INPUT_MAX_SIDE   : 긴 변을 이 크기(px) 이하로 줄여서 추론 (0 이면 원본 크기)
+POSE_BACKEND = os.getenv("EMG_POSE_BACKEND", "holistic")
+MODEL_COMPLEXITY = int(os.getenv("EMG_MODEL_COMPLEXITY", 1))
+INPUT_MAX_SIDE = int(os.getenv("EMG_INPUT_MAX_SIDE", 0))
+
+
+def create_model(backend=POSE_BACKEND, model_complexity=MODEL_COMPLEXITY):
+    """
+    포즈 추정 모델을 생성합니다.
+    한 세션의 프레임은 항상 같은 모델이 순서대로 처리하므로 프레임 간 추적(tracking)을 사용합니다.
+    """
+    import mediapipe as mp
+
+    if backend == "pose":
+        return mp.solutions.pose.Pose(
+            static_image_mode=False,
+            model_complexity=model_complexity,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+    if backend == "holistic":
+        return mp.solutions.holistic.Holistic(
+            static_image_mode=False,
+            model_complexity=model_complexity,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+    raise ValueError(f"Unknown pose backend: {backend}")
+
+
+def downscale(rgb_image, max_side=INPUT_MAX_SIDE):
+    """
+    긴 변이 max_side 를 넘으면 비율을 유지하여 줄입니다.
+    랜드마크는 정규화 좌표(0~1)이므로 크기를 줄여도 움직임 판정 기준은 그대로입니다.
+    """
+    h, w = rgb_image.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return rgb_image
+    scale = max_side / max(h, w)
+    return cv2.resize(rgb_image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def landmarks_to_array(pose_landmarks):
+    """
+    포즈 랜드마크를 (랜드마크 수, 2) 정규화 좌표 배열로 변환합니다.
+    """
+    return np.array([(landmark.x, landmark.y) for landmark in pose_landmarks.landmark], dtype=np.float32)
+
+
+class PosePool:
+    """
+    포즈 모델 풀. 세션 키의 해시로 모델을 고르므로 한 세션의 프레임은 항상 같은 모델이 순서대로 처리하여
+    MediaPipe 의 프레임 간 추적을 그대로 사용하고, 여러 세션은 풀의 모델들로 나뉘어 동시에 처리됩니다.
+    모델은 스레드 안전하지 않으므로 모델마다 잠금을 두며, 처음 필요할 때 생성합니다.
+    """
+
+    def __init__(self, size=POOL_SIZE, factory=create_model):
+        self.size = max(1, size)
+        self.factory = factory
+        self._models = [None] * self.size
+        self._locks = [threading.Lock() for _ in range(self.size)]
+
+    def _slot(self, key):
+        # 프로세스가 달라도 같은 값을 내도록 hash() 대신 crc32 사용
+        return zlib.crc32(str(key).encode("utf-8")) % self.size
+
+    def _model(self, slot):
+        # 호출하는 쪽에서 self._locks[slot] 을 잡고 있어야 함
+        if self._models[slot] is None:
+            self._models[slot] = self.factory()
+        return self._models[slot]
+
+    def warm_up(self):
+        """
+        모델 하나를 미리 만들어 둡니다.
+        """
+        with self._locks[0]:
+            self._model(0)
+        return self
+
+    def process(self, rgb_image, key=None):
+        """
+        RGB 이미지 한 장의 포즈 랜드마크 좌표 배열을 반환합니다. 사람이 없으면 None 입니다.
+        key 는 세션 키이며, 같은 세션의 프레임은 같은 모델에서 처리됩니다.
+        """
+        return self.process_batch([rgb_image], key)[0]
+
+    def process_batch(self, rgb_images, key=None):
+        """
+        한 세션의 여러 이미지를 그 세션의 모델로 순서대로 처리하고 입력 순서대로 결과 목록을 반환합니다.
+        """
+        slot = self._slot(key)
+        results = []
+        with self._locks[slot]:
+            model = self._model(slot)
+            for rgb_image in rgb_images:
+                result = model.process(downscale(rgb_image))
+                results.append(landmarks_to_array(result.pose_landmarks) if result.pose_landmarks else None)
+        return results
@@ -1,51 +1,293 @@
 #https://huggingface.co/hun3359/klue-bert-base-sentiment
 
-# Load model directly
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import argparse
+import inspect
+import os
+import re
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import model_registry
+from micro_batch import MicroBatcher
 
-tokenizer = AutoTokenizer.from_pretrained("hun3359/klue-bert-base-sentiment")
-model = AutoModelForSequenceClassification.from_pretrained("hun3359/klue-bert-base-sentiment")
+MODEL_NAME = "hun3359/klue-bert-base-sentiment"
+MODEL_DIR = os.getenv("SENTIMENT_MODEL_DIR", os.path.join("models", "klue-bert-base-sentiment"))
+ONNX_FILE = "model.onnx"
+# 추론 백엔드 : torch(기본값, FP32) / quantized(동적 INT8 양자화) / onnx(ONNX Runtime)
+BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")
+BACKENDS = ("torch", "quantized", "onnx")
 
-# 모델의 id2label 속성을 통해 감정 라벨을 가져옴
-id2label = model.config.id2label
+MAX_BATCH = 16       # 한 번에 추론할 최대 문장 수
+MAX_WAIT = 0.005     # 배치를 모으기 위해 기다리는 최대 시간(초)
+CACHE_SIZE = 4096    # 감정 분석 결과를 캐시할 최대 문장 수
+
+
+def model_source():
+    """
+    로컬 모델 디렉터리가 있으면 그 경로를, 없으면 Hugging Face 모델 이름을 반환합니다.
+    """
+    return MODEL_DIR if os.path.isdir(MODEL_DIR) else MODEL_NAME
+
+
+def build_backend(backend=BACKEND, source=None):
+    """
+    지정한 백엔드로 추론 함수를 만듭니다.
+    추론 함수는 문장 목록을 받아 (문장 수, 라벨 수) 크기의 logits 배열을 반환합니다.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend: {backend} (choose from {', '.join(BACKENDS)})")
+    source = source or model_source()
+
+    # Load model directly
+    from transformers import AutoConfig, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    # 모델의 id2label 속성을 통해 감정 라벨을 가져옴
+    id2label = AutoConfig.from_pretrained(source).id2label
+
+    if backend == "onnx":
+        import onnxruntime
+
+        onnx_path = os.path.join(source, ONNX_FILE)
+        if not os.path.isfile(onnx_path):
+            raise FileNotFoundError(f"{onnx_path} 가 없습니다. export_onnx() 로 먼저 내보내세요.")
+        session = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+        input_names = [node.name for node in session.get_inputs()]
+
+        def infer(texts):
+            # 배치 안에서 가장 긴 문장 길이에 맞춰서만 패딩
+            inputs = tokenizer(texts, return_tensors="np", truncation=True, padding="longest")
+            return session.run(None, {name: inputs[name].astype(np.int64) for name in input_names})[0]
+
+        return infer, id2label
+
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    model = AutoModelForSequenceClassification.from_pretrained(source)
+    model.eval()
+    if backend == "quantized":
+        # Linear 층의 가중치를 INT8 로 양자화 (CPU 추론 속도 향상, 메모리 감소)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def infer(texts):
+        # 배치 안에서 가장 긴 문장 길이에 맞춰서만 패딩
+        inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding="longest")
+        with torch.no_grad():
+            return model(**inputs).logits.numpy()
+
+    return infer, id2label
+
+
+def load_model():
+    """
+    SENTIMENT_BACKEND 로 모델을 로드합니다. (처음 감정 분석을 할 때 또는 워밍업 시 한 번만 호출됨)
+    """
+    infer, id2label = build_backend(BACKEND)
+    print(f"[SENTIMENT] backend={BACKEND}, source={model_source()}")
+    return infer, id2label
+
+
+model_registry.register("sentiment", load_model)
+
+
+def export_onnx(output_dir=MODEL_DIR, source=MODEL_NAME, opset=17):
+    """
+    PyTorch 모델과 토크나이저를 output_dir 에 저장하고 ONNX 모델(model.onnx)로 내보냅니다.
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForSequenceClassification.from_pretrained(source)
+    model.eval()
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+    model.save_pretrained(output_dir)
+
+    sample = tokenizer(["안녕하세요", "오늘은 기분이 좋아요"], return_tensors="pt", padding=True)
+    # 입력은 위치 인자로 전달되므로 토크나이저 출력 순서(input_ids, token_type_ids, attention_mask)가 아니라
+    # forward(input_ids, attention_mask, token_type_ids, ...) 의 인자 순서에 맞춰야 이름과 텐서가 어긋나지 않음
+    input_names = [name for name in inspect.signature(model.forward).parameters if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    onnx_path = os.path.join(output_dir, ONNX_FILE)
+    torch.onnx.export(model, tuple(sample[name] for name in input_names), onnx_path,
+                      input_names=input_names, output_names=["logits"],
+                      dynamic_axes=dynamic_axes, opset_version=opset)
+    print(f"ONNX 모델 저장 완료 : {onnx_path}")
+    return onnx_path
+
+
+def normalize_text(text):
+    """
+    캐시 키로 사용할 수 있도록 문장을 정규화합니다. (유니코드 NFC, 앞뒤 공백 제거, 연속 공백 축소)
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def predict(texts):
+    """
+    문장 목록을 한 번의 배치 추론으로 분석하여 감정 라벨 목록을 반환합니다.
+    """
+    infer, id2label = model_registry.get("sentiment")
+
+    # 가장 높은 확률을 가진 감정의 인덱스 (softmax 는 순서를 바꾸지 않으므로 logits 로 바로 계산)
+    top_indices = np.argmax(infer(texts), axis=1).tolist()
+
+    # 해당 인덱스의 감정 라벨 가져오기 (정수형 키 사용)
+    return [id2label[index] for index in top_indices]
+
+
+class SentimentService:
+    """
+    감정 분석 서비스. 요청은 MicroBatcher 워커가 잠깐 동안 모아 한 번의 배치 추론으로 분석합니다.
+    분석 결과는 정규화한 문장을 키로 LRU 캐시에 저장하여 자주 반복되는 인사말은 추론 없이 반환합니다.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT, cache_size=CACHE_SIZE, predict_fn=predict):
+        self.cache_size = cache_size
+        self.predict_fn = predict_fn
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._batcher = MicroBatcher(self._predict_batch, max_batch, max_wait, name="sentiment-worker")
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _cache_put(self, key, label):
+        with self._cache_lock:
+            self._cache[key] = label
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def submit(self, text):
+        """
+        문장을 큐에 넣고 감정 라벨을 받을 Future 를 반환합니다. 캐시에 있으면 바로 완료된 Future 를 반환합니다.
+        """
+        key = normalize_text(text)
+        label = self._cache_get(key)
+        if label is not None:
+            future = Future()
+            future.set_result(label)
+            return future
+        return self._batcher.submit(key)
+
+    def analyze(self, text, timeout=None):
+        """
+        문장의 감정 라벨을 반환합니다.
+        """
+        return self.submit(text).result(timeout)
+
+    def analyze_batch(self, texts, timeout=None):
+        """
+        여러 문장의 감정 라벨을 입력 순서대로 반환합니다. 같은 문장은 한 번만 분석합니다.
+        """
+        futures = {}
+        for text in texts:
+            key = normalize_text(text)
+            if key not in futures:
+                futures[key] = self.submit(key)
+        return [futures[normalize_text(text)].result(timeout) for text in texts]
+
+    def _predict_batch(self, keys):
+        # 큐에서 기다리는 동안 다른 배치가 분석한 문장은 캐시에서 가져오고, 나머지는 중복 없이 한 번에 추론
+        labels = {key: self._cache_get(key) for key in keys}
+        missing = [key for key, label in labels.items() if label is None]
+        if missing:
+            for key, label in zip(missing, self.predict_fn(missing)):
+                self._cache_put(key, label)
+                labels[key] = label
+        return [labels[key] for key in keys]
+
+
+service = SentimentService()
 
-# id2label 확인
-# print("id2label:", id2label)
 
 def analyze_sentiment(text):
     """
     입력된 텍스트에 대해 감정 분석을 수행하고,
-    가장 높은 확률을 가진 감정과 그 확률을 반환합니다.
+    가장 높은 확률을 가진 감정을 반환합니다.
+    """
+    return service.analyze(text)
+
+
+def analyze_batch(texts):
     """
-    # 입력 텍스트를 토큰화
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
+    여러 문장에 대해 감정 분석을 수행하고, 입력 순서대로 감정 라벨 목록을 반환합니다.
+    """
+    return service.analyze_batch(texts)
 
-    # 모델에 입력을 전달하여 예측 수행
-    with torch.no_grad():
-        outputs = model(**inputs)
-    logits = outputs.logits
 
-    # 소프트맥스 함수로 확률 계산
-    probabilities = torch.softmax(logits, dim=1).squeeze()
+# 패리티 검사에 사용할 기본 문장 (파일을 지정하지 않은 경우)
+PARITY_SAMPLES = [
+    "안녕하세요",
+    "오늘은 기분이 정말 좋아요",
+    "요즘 잠을 잘 못 자서 너무 피곤해요",
+    "아들이 전화를 안 받아서 서운하네요",
+    "무릎이 아파서 걱정이에요",
+    "손주가 놀러 와서 행복했어요",
+    "혼자 있으니까 외롭고 쓸쓸해요",
+    "병원 결과가 나올 때까지 불안해요",
+    "왜 이렇게 일이 안 풀리는지 화가 나요",
+    "밥은 먹었어요",
+]
 
-    # 가장 높은 확률을 가진 감정의 인덱스와 확률 가져오기
-    top_index = torch.argmax(probabilities).item()
-    top_probability = probabilities[top_index].item()
 
-    # 해당 인덱스의 감정 라벨 가져오기 (정수형 키 사용)
-    top_emotion = id2label[top_index]
-
-    # return top_emotion, top_probability
-    return top_emotion
-
-# 예제 문장 분석
-# if __name__ == "__main__":
-#     while True:
-#         text = input("분석할 문장을 입력하세요 (종료하려면 'exit' 입력): ")
-#         if text.lower() == "exit":
-#             break
-#         emotion, probability = analyze_sentiment(text)
-#         print(f"입력 문장: {text}")
-#         print(f"예측된 감정: {emotion}")
-#         print(f"확률: {probability:.4f}")
\ No newline at end of file
+def check_parity(backend, texts, source=None, batch_size=MAX_BATCH):
+    """
+    PyTorch(FP32) 모델과 지정한 백엔드의 감정 라벨을 비교하여 (일치율, 불일치 목록)을 반환합니다.
+    """
+    reference, id2label = build_backend("torch", source)
+    candidate, _ = build_backend(backend, source)
+    mismatches = []
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+        expected = np.argmax(reference(chunk), axis=1)
+        actual = np.argmax(candidate(chunk), axis=1)
+        for text, want, got in zip(chunk, expected, actual):
+            if want != got:
+                mismatches.append((text, id2label[int(want)], id2label[int(got)]))
+    agreement = 1 - len(mismatches) / len(texts) if texts else 1.0
+    return agreement, mismatches
+
+
+if __name__ == "__main__":
+    # python sentiment_analysis.py export [--output-dir DIR] [--source MODEL_OR_PATH]
+    # python sentiment_analysis.py parity --backend onnx [--file sentences.txt] [--min-agreement 0.99]
+    parser = argparse.ArgumentParser(description="KLUE-BERT 감정 분석 모델 변환 및 패리티 검사")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="모델을 로컬 디렉터리에 저장하고 ONNX 로 내보냅니다.")
+    export_parser.add_argument("--output-dir", default=MODEL_DIR)
+    export_parser.add_argument("--source", default=MODEL_NAME, help="Hugging Face 모델 이름 또는 로컬 체크포인트 경로")
+
+    parity_parser = subparsers.add_parser("parity", help="PyTorch 라벨과 다른 백엔드의 라벨을 비교합니다.")
+    parity_parser.add_argument("--backend", choices=BACKENDS, default=BACKEND)
+    parity_parser.add_argument("--file", help="한 줄에 한 문장씩 적힌 UTF-8 텍스트 파일")
+    parity_parser.add_argument("--min-agreement", type=float, default=0.99)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_onnx(args.output_dir, args.source)
+        sys.exit(0)
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            samples = [line.strip() for line in f if line.strip()]
+    else:
+        samples = PARITY_SAMPLES
+    agreement, mismatches = check_parity(args.backend, samples)
+    for text, expected, actual in mismatches:
+        print(f"불일치 : {text} (torch={expected}, {args.backend}={actual})")
+    print(f"{args.backend} 일치율 : {agreement:.4f} ({len(samples) - len(mismatches)}/{len(samples)})")
+    sys.exit(0 if agreement >= args.min_agreement else 1)
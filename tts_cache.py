@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+
+CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("processed", "tts_cache"))
+MEMORY_LIMIT = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))  # 메모리 캐시 최대 크기(바이트)
+DISK_LIMIT = int(os.getenv("TTS_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))    # 디스크 캐시 최대 크기(바이트)
+DEFAULT_LANG = "ko"
+DEFAULT_VOICE = "com"  # gTTS 의 tld (같은 언어에서 억양/음성을 결정)
+
+
+def cache_key(text, lang=DEFAULT_LANG, voice=DEFAULT_VOICE):
+    """
+    (텍스트, 언어, 음성)의 sha256 해시를 캐시 키로 사용합니다.
+    """
+    payload = json.dumps([text, lang, voice], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def synthesize(text, lang=DEFAULT_LANG, voice=DEFAULT_VOICE):
+    """
+    gTTS 로 음성을 합성하여 MP3 바이트를 반환합니다.
+    """
+    from gtts import gTTS
+
+    audio_data = BytesIO()
+    gTTS(text, lang=lang, tld=voice).write_to_fp(audio_data)
+    return audio_data.getvalue()
+
+
+class TTSCache:
+    """
+    TTS 음성(MP3)을 키(해시)별로 저장하는 캐시.
+    메모리에는 바이트 크기 기준 LRU 로 보관하고, 디스크에도 저장하여 재시작 후에도 재사용합니다.
+    디스크 캐시가 disk_limit 를 넘으면 가장 오래 사용하지 않은 파일부터 삭제합니다.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, memory_limit=MEMORY_LIMIT, disk_limit=DISK_LIMIT):
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".mp3")
+
+    def _remember(self, key, data):
+        if len(data) > self.memory_limit:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        """
+        디렉터리를 다시 읽어 전체 크기를 계산하고, disk_limit 를 넘으면 오래 사용하지 않은 파일부터 삭제합니다.
+        같은 디렉터리를 여러 워커 프로세스가 함께 쓰므로 프로세스별 기록 대신 실제 파일을 기준으로 합니다.
+        """
+        with self._evict_lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".mp3"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue  # 다른 워커가 방금 삭제한 파일
+                entries.append((stat.st_mtime, path, stat.st_size))
+                total += stat.st_size
+            if total <= self.disk_limit:
+                return
+            for _, path, size in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.disk_limit:
+                    return
+
+    def get(self, key):
+        """
+        캐시된 음성 바이트를 반환합니다. 없으면 None 을 반환합니다.
+        메모리에 없으면 디스크 파일을 직접 확인하므로, 다른 워커가 저장한 음성도 재사용합니다.
+        """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # 디스크 LRU 순서를 재시작 후에도 유지
+        except OSError:
+            return None
+        with self._lock:
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """
+        음성 바이트를 메모리와 디스크에 저장합니다.
+        """
+        with self._lock:
+            self._remember(key, data)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            print(f"[ERROR] TTS 캐시 저장 실패 : {e}")
+
+    def get_or_synthesize(self, text, lang=DEFAULT_LANG, voice=DEFAULT_VOICE, synthesize_fn=synthesize):
+        """
+        캐시에 있으면 바로 반환하고, 없으면 합성하여 저장한 뒤 반환합니다.
+        같은 문장을 동시에 요청하면 한 번만 합성합니다.
+        """
+        key = cache_key(text, lang, voice)
+        data = self.get(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            data = synthesize_fn(text, lang, voice)
+            self.put(key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+cache = TTSCache()
+
+
+def get_audio(text, lang=DEFAULT_LANG, voice=DEFAULT_VOICE):
+    """
+    텍스트의 MP3 음성 바이트를 반환합니다. (캐시 사용)
+    """
+    return cache.get_or_synthesize(text, lang, voice)